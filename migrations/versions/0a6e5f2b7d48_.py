@@ -0,0 +1,58 @@
+"""empty message
+
+Revision ID: 0a6e5f2b7d48
+Revises: f81d3c6a0b95
+Create Date: 2026-10-17 18:12:40.527391
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a6e5f2b7d48'
+down_revision = 'f81d3c6a0b95'
+branch_labels = None
+depends_on = None
+
+TABLES = ['character', 'planet', 'vehicle']
+EPOCH = '1970-01-01 00:00:00.000000'
+
+
+def upgrade():
+    # Plain ALTER TABLE (see e4b7a2d9c610). Existing rows get the epoch, a
+    # constant SQLite accepts as the default of an added column, so they are
+    # part of any sync that starts without a token. SQLite compares the
+    # stored text, so the default is written the way SQLAlchemy binds
+    # datetimes there (with microseconds)
+    for table in TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), server_default=EPOCH, nullable=False))
+        op.create_index('ix_%s_updated_at_id' % table, table, ['updated_at', 'id'], unique=False)
+
+    op.add_column('favorite', sa.Column('updated_at', sa.DateTime(), server_default=EPOCH, nullable=False))
+    op.create_index('ix_favorite_user_id_updated_at_id', 'favorite', ['user_id', 'updated_at', 'id'], unique=False)
+
+    op.create_table('tombstone',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('table_name', sa.String(length=50), nullable=False),
+    sa.Column('row_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('tombstone', schema=None) as batch_op:
+        batch_op.create_index('ix_tombstone_user_id_deleted_at_id', ['user_id', 'deleted_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('tombstone', schema=None) as batch_op:
+        batch_op.drop_index('ix_tombstone_user_id_deleted_at_id')
+
+    op.drop_table('tombstone')
+
+    op.drop_index('ix_favorite_user_id_updated_at_id', table_name='favorite')
+    op.drop_column('favorite', 'updated_at')
+
+    for table in reversed(TABLES):
+        op.drop_index('ix_%s_updated_at_id' % table, table_name=table)
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,46 @@
+"""empty message
+
+Revision ID: 3f2c9a7d1e64
+Revises: a142e9e62b45
+Create Date: 2026-10-17 10:12:03.418207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2c9a7d1e64'
+down_revision = 'a142e9e62b45'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Remove duplicated favorites so the unique indexes can be built
+    for table, column in [('favorite_character', 'character_id'), ('favorite_planet', 'planet_id'), ('favorite_vehicle', 'vehicle_id')]:
+        op.execute(
+            'DELETE FROM {table} WHERE id NOT IN ('
+            'SELECT min_id FROM (SELECT MIN(id) AS min_id FROM {table} GROUP BY user_id, {column}) AS keep'
+            ')'.format(table=table, column=column)
+        )
+
+    with op.batch_alter_table('favorite_character', schema=None) as batch_op:
+        batch_op.create_index('ix_favorite_character_user_id_character_id', ['user_id', 'character_id'], unique=True)
+
+    with op.batch_alter_table('favorite_planet', schema=None) as batch_op:
+        batch_op.create_index('ix_favorite_planet_user_id_planet_id', ['user_id', 'planet_id'], unique=True)
+
+    with op.batch_alter_table('favorite_vehicle', schema=None) as batch_op:
+        batch_op.create_index('ix_favorite_vehicle_user_id_vehicle_id', ['user_id', 'vehicle_id'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('favorite_vehicle', schema=None) as batch_op:
+        batch_op.drop_index('ix_favorite_vehicle_user_id_vehicle_id')
+
+    with op.batch_alter_table('favorite_planet', schema=None) as batch_op:
+        batch_op.drop_index('ix_favorite_planet_user_id_planet_id')
+
+    with op.batch_alter_table('favorite_character', schema=None) as batch_op:
+        batch_op.drop_index('ix_favorite_character_user_id_character_id')
@@ -0,0 +1,37 @@
+"""empty message
+
+Revision ID: 5c3e8b1f7a92
+Revises: 0a6e5f2b7d48
+Create Date: 2026-10-17 20:41:17.602214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c3e8b1f7a92'
+down_revision = '0a6e5f2b7d48'
+branch_labels = None
+depends_on = None
+
+TABLES = ['character', 'planet', 'vehicle']
+
+
+def upgrade():
+    table_version = op.create_table('table_version',
+    sa.Column('table_name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+    op.bulk_insert(table_version, [{'table_name': table, 'version': 0} for table in TABLES])
+
+    with op.batch_alter_table('tombstone', schema=None) as batch_op:
+        batch_op.create_index('ix_tombstone_table_name_id', ['table_name', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('tombstone', schema=None) as batch_op:
+        batch_op.drop_index('ix_tombstone_table_name_id')
+
+    op.drop_table('table_version')
@@ -0,0 +1,36 @@
+"""empty message
+
+Revision ID: 8e2d6b0c4f13
+Revises: 5c3e8b1f7a92
+Create Date: 2026-10-17 21:05:52.318940
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e2d6b0c4f13'
+down_revision = '5c3e8b1f7a92'
+branch_labels = None
+depends_on = None
+
+TABLES = ['character', 'planet', 'vehicle']
+
+
+def upgrade():
+    with op.batch_alter_table('favorite', schema=None) as batch_op:
+        batch_op.create_index('ix_favorite_kind_entity_id', ['kind', 'entity_id'], unique=False)
+
+    # Favorites left behind by entities deleted before the deletes cleaned
+    # up the unified table
+    for table in TABLES:
+        op.execute(
+            "DELETE FROM favorite WHERE kind = '{table}' AND NOT EXISTS "
+            "(SELECT 1 FROM {table} WHERE {table}.id = favorite.entity_id)".format(table=table)
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('favorite', schema=None) as batch_op:
+        batch_op.drop_index('ix_favorite_kind_entity_id')
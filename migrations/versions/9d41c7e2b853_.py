@@ -0,0 +1,68 @@
+"""empty message
+
+Revision ID: 9d41c7e2b853
+Revises: 6b8e0d4a2c17
+Create Date: 2026-10-17 13:40:22.905114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d41c7e2b853'
+down_revision = '6b8e0d4a2c17'
+branch_labels = None
+depends_on = None
+
+TABLES = ['character', 'planet', 'vehicle']
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    for table in TABLES:
+        # name_prefix lookups
+        if dialect == 'postgresql':
+            op.create_index('ix_%s_lower_name' % table, table, [sa.text('lower(name) text_pattern_ops')])
+        else:
+            op.create_index('ix_%s_lower_name' % table, table, [sa.text('lower(name)')])
+
+        # full-text search, PostgreSQL GIN over a tsvector and SQLite FTS5
+        if dialect == 'postgresql':
+            op.create_index(
+                'ix_%s_search' % table, table,
+                [sa.text("to_tsvector('simple', name || ' ' || coalesce(description, ''))")],
+                postgresql_using='gin'
+            )
+        elif dialect == 'sqlite':
+            fts = table + '_fts'
+            op.execute(
+                "CREATE VIRTUAL TABLE {fts} USING fts5(name, description, content='{table}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')".format(fts=fts, table=table)
+            )
+            op.execute(
+                "CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN "
+                "INSERT INTO {fts}(rowid, name, description) VALUES (new.id, new.name, new.description); END".format(fts=fts, table=table)
+            )
+            op.execute(
+                "CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN "
+                "INSERT INTO {fts}({fts}, rowid, name, description) VALUES ('delete', old.id, old.name, old.description); END".format(fts=fts, table=table)
+            )
+            op.execute(
+                "CREATE TRIGGER {fts}_update AFTER UPDATE ON {table} BEGIN "
+                "INSERT INTO {fts}({fts}, rowid, name, description) VALUES ('delete', old.id, old.name, old.description); "
+                "INSERT INTO {fts}(rowid, name, description) VALUES (new.id, new.name, new.description); END".format(fts=fts, table=table)
+            )
+            op.execute("INSERT INTO {fts}({fts}) VALUES ('rebuild')".format(fts=fts))
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for table in TABLES:
+        if dialect == 'postgresql':
+            op.drop_index('ix_%s_search' % table, table_name=table)
+        elif dialect == 'sqlite':
+            fts = table + '_fts'
+            for trigger in ['insert', 'delete', 'update']:
+                op.execute('DROP TRIGGER IF EXISTS {fts}_{trigger}'.format(fts=fts, trigger=trigger))
+            op.execute('DROP TABLE IF EXISTS {fts}'.format(fts=fts))
+        op.drop_index('ix_%s_lower_name' % table, table_name=table)
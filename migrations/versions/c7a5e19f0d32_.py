@@ -0,0 +1,63 @@
+"""empty message
+
+Revision ID: c7a5e19f0d32
+Revises: 9d41c7e2b853
+Create Date: 2026-10-17 15:02:47.310558
+
+"""
+import base64
+import hashlib
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7a5e19f0d32'
+down_revision = '9d41c7e2b853'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+
+
+def hash_password(password, n=2 ** 14, r=8, p=1):
+    # Same format as src/passwords.py
+    salt = os.urandom(16)
+    digest = hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r + 1024 * 1024, dklen=32)
+    return 'scrypt$%d$%d$%d$%s$%s' % (n, r, p, base64.b64encode(salt).decode(), base64.b64encode(digest).decode())
+
+
+def upgrade():
+    # SQLite does not enforce VARCHAR lengths, and its batch copy of user
+    # fails on the favorites' foreign keys (enforced by the connect hook)
+    if op.get_bind().dialect.name != 'sqlite':
+        with op.batch_alter_table('user', schema=None) as batch_op:
+            batch_op.alter_column('password',
+                   existing_type=sa.String(length=50),
+                   type_=sa.String(length=255),
+                   existing_nullable=False)
+
+    # Hash the plaintext passwords stored so far
+    user = sa.table('user', sa.column('id', sa.Integer), sa.column('password', sa.String))
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(user.c.id, user.c.password).where(user.c.id > last_id).order_by(user.c.id).limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        for user_id, password in rows:
+            if not password.startswith('scrypt$'):
+                connection.execute(
+                    user.update().where(user.c.id == user_id).values(password=hash_password(password))
+                )
+        last_id = rows[-1][0]
+
+
+def downgrade():
+    # Hashes cannot be turned back into passwords and do not fit in the old
+    # String(50), so the column keeps its 255 characters
+    pass
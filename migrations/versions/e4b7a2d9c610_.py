@@ -0,0 +1,62 @@
+"""empty message
+
+Revision ID: e4b7a2d9c610
+Revises: c7a5e19f0d32
+Create Date: 2026-10-17 16:21:08.904217
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b7a2d9c610'
+down_revision = 'c7a5e19f0d32'
+branch_labels = None
+depends_on = None
+
+KINDS = [
+    ('character', 'favorite_character', 'character_id'),
+    ('planet', 'favorite_planet', 'planet_id'),
+    ('vehicle', 'favorite_vehicle', 'vehicle_id'),
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    for table, favorite_table, entity_fk in KINDS:
+        # Plain ALTER TABLE: a batch copy on SQLite would drop the lower(name)
+        # indexes and the FTS triggers of these tables
+        op.add_column(table, sa.Column('favorites_count', sa.Integer(), server_default='0', nullable=False))
+        op.create_index('ix_%s_favorites_count' % table, table, ['favorites_count', 'id'], unique=False)
+
+        # Backfill the counters from the existing favorites
+        entity = sa.table(table, sa.column('id', sa.Integer), sa.column('favorites_count', sa.Integer))
+        favorite = sa.table(favorite_table, sa.column('id', sa.Integer), sa.column(entity_fk, sa.Integer))
+        count = sa.select(sa.func.count(favorite.c.id)).where(favorite.c[entity_fk] == entity.c.id).scalar_subquery()
+        op.execute(entity.update().values(favorites_count=count))
+
+        if dialect == 'sqlite':
+            # Counter updates must not rewrite the FTS index
+            fts = table + '_fts'
+            op.execute('DROP TRIGGER IF EXISTS {fts}_update'.format(fts=fts))
+            op.execute(
+                "CREATE TRIGGER {fts}_update AFTER UPDATE OF name, description ON {table} BEGIN "
+                "INSERT INTO {fts}({fts}, rowid, name, description) VALUES ('delete', old.id, old.name, old.description); "
+                "INSERT INTO {fts}(rowid, name, description) VALUES (new.id, new.name, new.description); END".format(fts=fts, table=table)
+            )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for table, _, _ in reversed(KINDS):
+        if dialect == 'sqlite':
+            fts = table + '_fts'
+            op.execute('DROP TRIGGER IF EXISTS {fts}_update'.format(fts=fts))
+            op.execute(
+                "CREATE TRIGGER {fts}_update AFTER UPDATE ON {table} BEGIN "
+                "INSERT INTO {fts}({fts}, rowid, name, description) VALUES ('delete', old.id, old.name, old.description); "
+                "INSERT INTO {fts}(rowid, name, description) VALUES (new.id, new.name, new.description); END".format(fts=fts, table=table)
+            )
+        op.drop_index('ix_%s_favorites_count' % table, table_name=table)
+        op.drop_column(table, 'favorites_count')
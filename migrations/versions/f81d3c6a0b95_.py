@@ -0,0 +1,71 @@
+"""empty message
+
+Revision ID: f81d3c6a0b95
+Revises: e4b7a2d9c610
+Create Date: 2026-10-17 17:05:33.118402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f81d3c6a0b95'
+down_revision = 'e4b7a2d9c610'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+KINDS = [
+    ('character', 'favorite_character', 'character_id'),
+    ('planet', 'favorite_planet', 'planet_id'),
+    ('vehicle', 'favorite_vehicle', 'vehicle_id'),
+]
+
+
+def upgrade():
+    op.create_table('favorite',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('favorite', schema=None) as batch_op:
+        batch_op.create_index('ix_favorite_user_id_kind_entity_id', ['user_id', 'kind', 'entity_id'], unique=True)
+        batch_op.create_index('ix_favorite_user_id_id_kind_entity_id', ['user_id', 'id', 'kind', 'entity_id'], unique=False)
+
+    # Backfill from the per-kind tables, committing every batch so no lock is
+    # held for the whole copy. Rows written by dual-writing app instances in
+    # the meantime are skipped, `flask backfill-favorites` repeats the copy
+    favorite = sa.table('favorite', sa.column('id', sa.Integer), sa.column('user_id', sa.Integer), sa.column('kind', sa.String), sa.column('entity_id', sa.Integer))
+    bind = op.get_bind()
+    for kind, source_table, entity_fk in KINDS:
+        source = sa.table(source_table, sa.column('id', sa.Integer), sa.column('user_id', sa.Integer), sa.column(entity_fk, sa.Integer))
+        last_id = 0
+        while True:
+            with op.get_context().autocommit_block():
+                ids = bind.execute(
+                    sa.select(source.c.id).where(source.c.id > last_id).order_by(source.c.id).limit(BATCH_SIZE)
+                ).scalars().all()
+                if not ids:
+                    break
+                missing = ~sa.select(favorite.c.id).where(
+                    favorite.c.user_id == source.c.user_id, favorite.c.kind == kind, favorite.c.entity_id == source.c[entity_fk]
+                ).exists()
+                bind.execute(favorite.insert().from_select(
+                    ['user_id', 'kind', 'entity_id'],
+                    sa.select(source.c.user_id, sa.literal(kind), source.c[entity_fk]).where(
+                        source.c.id.between(ids[0], ids[-1]), source.c.user_id.isnot(None), source.c[entity_fk].isnot(None), missing
+                    ).order_by(source.c.id)
+                ))
+            last_id = ids[-1]
+
+
+def downgrade():
+    with op.batch_alter_table('favorite', schema=None) as batch_op:
+        batch_op.drop_index('ix_favorite_user_id_id_kind_entity_id')
+        batch_op.drop_index('ix_favorite_user_id_kind_entity_id')
+
+    op.drop_table('favorite')
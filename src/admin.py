@@ -1,6 +1,6 @@
 import os
 from flask_admin import Admin
-from models import db, User, Planet, Character, Vehicle, FavoritePlanet, FavoriteCharacter, FavoriteVehicle
+from models import db, User, Planet, Character, Vehicle, FavoritePlanet, FavoriteCharacter, FavoriteVehicle, Favorite
 from flask_admin.contrib.sqla import ModelView
 
 def setup_admin(app):
@@ -15,3 +15,4 @@ def setup_admin(app):
     admin.add_view(ModelView(FavoriteCharacter, db.session))
     admin.add_view(ModelView(FavoritePlanet, db.session))
     admin.add_view(ModelView(FavoriteVehicle, db.session))
+    admin.add_view(ModelView(Favorite, db.session))
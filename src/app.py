@@ -3,13 +3,22 @@ from flask import Flask, request, jsonify, url_for
 from flask_migrate import Migrate
 from flask_swagger import swagger
 from flask_cors import CORS
-from utils import APIException, generate_sitemap
+from utils import APIException, parse_limit, generate_sitemap, stream_ndjson, wants_stream, parse_bulk_body, conditional_get, serialize_page, selected_fields, FastJSONProvider
 from admin import setup_admin
-from models import db, User, Character, Planet, Vehicle, FavoriteCharacter, FavoritePlanet, FavoriteVehicle
-from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required, JWTManager 
+from models import db, User, Character, Planet, Vehicle, FavoriteCharacter, FavoritePlanet, FavoriteVehicle, get_user_favorites, insert_favorite, delete_favorite, bulk_create, bulk_delete, get_serialized, get_leaderboard, reconcile_favorite_counts, backfill_favorites
+from database import engine_options, get_pool_stats, replica_binds, replica_reads, use_primary, pin_to_primary, is_pinned_to_primary, primary_after_writes
+from search import SEARCHABLE_MODELS, list_page, search_page
+from changes import changes_page
+from compression import compress_response
+from metrics import setup_metrics, query_budget, internal_only
+from ratelimit import rate_limit
+from passwords import hash_password, check_password
+from cache import favorites_cache, favorites_key, invalidate_favorites, get_cached_identity, set_cached_identity, catalog_cache, catalog_key, invalidate_catalog, cache_stats
+from flask_jwt_extended import create_access_token, get_jwt, get_jwt_identity, jwt_required, JWTManager 
 
 app = Flask(__name__)
 app.url_map.strict_slashes = False
+app.json = FastJSONProvider(app)
 
 app.config["JWT_SECRET_KEY"] = "super-secret"
 jwt = JWTManager(app)
@@ -20,11 +29,15 @@ if db_url is not None:
 else:
     app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+app.config['SQLALCHEMY_BINDS'] = replica_binds()
 
 MIGRATE = Migrate(app, db)
 db.init_app(app)
 CORS(app)
 setup_admin(app)
+setup_metrics(app)
+app.after_request(compress_response)
 
 # Handle/serialize errors like a JSON object
 @app.errorhandler(APIException)
@@ -36,48 +49,118 @@ def handle_invalid_usage(error):
 def sitemap():
     return generate_sitemap(app)
 
+def current_user_id():
+    # Tokens issued by /signup and /login carry the user id as a claim,
+    # older tokens fall back to a cached lookup by email
+    user_id = get_jwt().get("user_id")
+    if user_id is not None:
+        return user_id
+    email = get_jwt_identity()
+    user_id = get_cached_identity(email)
+    if user_id is None:
+        user = User.query.filter_by(email=email).first()
+        if user is None:
+            raise APIException("User not found", status_code=401)
+        user_id = user.id
+        set_cached_identity(email, user_id)
+    return user_id
+
+@app.route('/cache/stats', methods=['GET'])
+@internal_only
+def get_cache_stats():
+    return jsonify(cache_stats()), 200
+
+@app.route('/db/stats', methods=['GET'])
+@internal_only
+def get_db_stats():
+    return jsonify(get_pool_stats(db.engine)), 200
+
+@app.route('/search', methods=['GET'])
+@replica_reads
+def search_catalog():
+    primary_after_writes(*[model.__tablename__ for model in SEARCHABLE_MODELS.values()])
+    results = {}
+    # The kinds share the offset cursor, next says which of them have more
+    next_cursors = {}
+    for kind, model in SEARCHABLE_MODELS.items():
+        page = catalog_cache.get_or_set(
+            catalog_key(model, "search", request.query_string),
+            lambda: search_page(model, request.args)
+        )
+        results[kind] = page["results"] if page is not None else []
+        next_cursors[kind] = page["next"] if page is not None else None
+    if results["people"] == [] and results["planets"] == [] and results["vehicles"] == []:
+        return jsonify({"msg": "No results"}), 404
+    return jsonify({"msg": "ok", "results": results, "next": next_cursors}), 200
+
+@app.route('/leaderboard/<kind>', methods=['GET'])
+@replica_reads
+def get_most_favorited(kind):
+    model = SEARCHABLE_MODELS.get(kind)
+    if model is None:
+        raise APIException("Unknown leaderboard, use people, planets or vehicles", status_code=404)
+    results = get_leaderboard(model, parse_limit(request.args.get("limit", 10)))
+    return jsonify({"msg": "ok", "results": results}), 200
+
+@app.route('/changes', methods=['GET'])
+@replica_reads
+@jwt_required(optional=True)
+def get_changes():
+    # Delta sync: catalog changes for everyone, favorites when authenticated
+    user_id = current_user_id() if get_jwt_identity() is not None else None
+    if user_id is not None and is_pinned_to_primary(user_id):
+        use_primary()
+    return jsonify(changes_page(request.args, user_id)), 200
+
 @app.route("/signup", methods=["POST"])
+@rate_limit("auth")
 def signup():
     email = request.json.get("email", None)
     password = request.json.get("password", None)
+    if not email or not password:
+        return jsonify({"msg": "Email and password are required"}), 400
     user_exist = User.query.filter_by(email=email).first()
     if user_exist is None: 
         new_user = User(
             email=email, 
-            password=password
+            password=hash_password(password)
         )
         db.session.add(new_user)
         db.session.commit()
-        access_token = create_access_token(identity=email)
+        access_token = create_access_token(identity=email, additional_claims={"user_id": new_user.id})
         return jsonify(access_token=access_token), 200
     else:
         return jsonify({"msg": "User has already exist"}), 400
     
 @app.route("/login", methods=["POST"])
+@rate_limit("auth")
 def login():
     email = request.json.get("email", None)
     password = request.json.get("password", None)
     user_exist = User.query.filter_by(email=email).first()
     if user_exist is None:
         return jsonify({"msg": "Email doesnt exist"}), 404
-    if email != user_exist.email or password != user_exist.password:
+    valid, needs_rehash = check_password(user_exist.password, password)
+    if email != user_exist.email or not valid:
         return jsonify({"msg": "Bad email or password"}), 401
-    access_token = create_access_token(identity=email)
+    if needs_rehash:
+        user_exist.password = hash_password(password)
+        db.session.commit()
+    access_token = create_access_token(identity=email, additional_claims={"user_id": user_exist.id})
     return jsonify(access_token=access_token)
 
 @app.route('/users', methods=['GET'])
+@replica_reads
 def get_all_users():
-    all_users = User.query.all()
-    all_users_list = list(map(lambda item:item.serialize(), all_users))
-    if all_users_list == []:
+    if wants_stream(request):
+        return stream_ndjson(User, request.args)
+    response_body = serialize_page(User, request.args)
+    if response_body is None:
         return jsonify({"msg":"Users not found"}), 404
-    response_body = {
-        "msg": "ok",
-        "results": all_users_list
-    }
     return jsonify(response_body), 200
 
 @app.route('/users/<int:users_id>', methods=['GET'])
+@replica_reads
 def get_one_user(users_id):
     user = User.query.get(users_id)
     if user is None:
@@ -85,51 +168,59 @@ def get_one_user(users_id):
     return jsonify(user.serialize()), 200
 
 @app.route('/users/favorites', methods=['GET'])
+@replica_reads
 @jwt_required()
 def get_all_favorites():
-    email =  get_jwt_identity()
-    user_exist = User.query.filter_by(email=email).first()
-    user_id = user_exist.id
-    all_favorite_character = FavoriteCharacter.query.filter_by(user_id=user_id).all()
-    all_favorite_planet = FavoritePlanet.query.filter_by(user_id=user_id).all()
-    all_favorite_vehicle = FavoriteVehicle.query.filter_by(user_id=user_id).all()
-    all_favorite_character_list = list(map(lambda item: item.serialize(), all_favorite_character))
-    all_favorite_planet_list = list(map(lambda item: item.serialize(), all_favorite_planet))
-    all_favorite_vehicle_list = list(map(lambda item: item.serialize(), all_favorite_vehicle))
+    user_id = current_user_id()
+    if is_pinned_to_primary(user_id):
+        use_primary()
+    else:
+        primary_after_writes("favorites")
+    favorites = favorites_cache.get_or_set(favorites_key(user_id), lambda: get_user_favorites(user_id))
+    all_favorite_character_list, all_favorite_planet_list, all_favorite_vehicle_list = favorites
    
     if all_favorite_character_list == [] and all_favorite_planet_list == [] and all_favorite_vehicle_list == []:
         return jsonify({"msg":"There are not favorites"}), 404
+
+    # ?expand=1 embeds the favorited entity so clients need no follow-up requests
+    if request.args.get("expand") != "1":
+        favorites = [
+            [{key: value for key, value in item.items() if key not in ("character", "planet", "vehicle")} for item in favorite_list]
+            for favorite_list in favorites
+        ]
     
     response_body = {
         "msg": "ok",
-        "results": [
-            all_favorite_character_list,
-            all_favorite_planet_list,
-            all_favorite_vehicle_list
-        ]
+        "results": favorites
     }    
     return jsonify(response_body), 200
     
 @app.route('/people', methods=['GET'])
+@replica_reads
+@conditional_get(Character)
 def get_all_characters():
-    all_characters = Character.query.all()
-    all_characters_list = list(map(lambda item:item.serialize(), all_characters))
-    if all_characters_list == []:
+    if wants_stream(request):
+        return stream_ndjson(Character, request.args)
+    response_body = catalog_cache.get_or_set(
+        catalog_key(Character, "list", request.query_string),
+        lambda: list_page(Character, request.args)
+    )
+    if response_body is None:
         return jsonify({"msg":"Characters not found"}), 404
-    response_body = {
-        "msg": "ok",
-        "results": all_characters_list
-    }
     return jsonify(response_body), 200
 
 @app.route('/people/<int:people_id>', methods=['GET'])
+@replica_reads
+@conditional_get(Character)
 def get_one_character(people_id):
-    character = Character.query.get(people_id)
+    fields = selected_fields(Character, request.args)
+    character = catalog_cache.get_or_set(catalog_key(Character, people_id, fields), lambda: get_serialized(Character, people_id, fields))
     if character is None:
         return jsonify({"msg":"Character not exist"}), 404
-    return jsonify(character.serialize()), 200
+    return jsonify(character), 200
 
 @app.route('/people', methods=['POST'])
+@rate_limit("write")
 def create_one_character():
     body = request.json
     character = Character.query.filter_by(name=body["name"]).first()
@@ -144,72 +235,87 @@ def create_one_character():
         return jsonify({"msg": "Character has already exist"}), 400
 
 @app.route('/people/<int:people_id>', methods=['DELETE'])
+@rate_limit("write")
 def delete_character(people_id):
     character_to_delete = Character.query.filter_by(id=people_id).first()
     if character_to_delete:
         db.session.delete(character_to_delete)
         db.session.commit()
+        invalidate_favorites()
         return jsonify({"msg": "Character deleted"}), 200
     else:
         return jsonify({"msg": "Character not found"}), 404
 
+@app.route('/people/bulk', methods=['POST'])
+@rate_limit("write")
+@query_budget(None)
+def create_bulk_characters():
+    items = parse_bulk_body(request)
+    results = bulk_create(Character, items)
+    invalidate_catalog(Character)
+    return jsonify({"msg": "ok", "results": results}), 200
+
+@app.route('/people/bulk', methods=['DELETE'])
+@rate_limit("write")
+@query_budget(None)
+def delete_bulk_characters():
+    ids = parse_bulk_body(request)
+    results = bulk_delete(Character, ids)
+    invalidate_catalog(Character)
+    invalidate_favorites()
+    return jsonify({"msg": "ok", "results": results}), 200
+
 @app.route("/favorite/people/<int:people_id>", methods=["POST"])
+@rate_limit("write")
 @jwt_required()
 def add_favorite_character(people_id): 
-    email = get_jwt_identity()
-    user_exist = User.query.filter_by(email=email).first()
-    user_id = user_exist.id
-    character_exist = Character.query.filter_by(id=people_id).first()
-    if character_exist is None:
-        return ({"msg": "This character doesn't exist"}), 400
-    else:
-        exist_favorite_character = FavoriteCharacter.query.filter_by(character_id=people_id, user_id=user_id).first()
-        if exist_favorite_character is None:
-            new_favorite_character = FavoriteCharacter(character_id=people_id, user_id=user_id)
-            db.session.add(new_favorite_character)
-            db.session.commit()
-            return jsonify({"msg": "Character added to favorites"}), 201
-        else:  
-            return jsonify({'msg': 'Character has already exist in favorites'}), 400
-        
+    user_id = current_user_id()
+    result = insert_favorite(FavoriteCharacter, FavoriteCharacter.character_id, user_id, people_id)
+    if result == "missing":
+        return jsonify({"msg": "This character doesn't exist"}), 400
+    if result == "exists":
+        return jsonify({'msg': 'Character has already exist in favorites'}), 400
+    invalidate_favorites(user_id)
+    pin_to_primary(user_id)
+    return jsonify({"msg": "Character added to favorites"}), 201
+
 @app.route('/favorite/people/<int:people_id>', methods=['DELETE'])
+@rate_limit("write")
 @jwt_required()
 def delete_favorite_character(people_id): 
-    email = get_jwt_identity()
-    user_exist = User.query.filter_by(email=email).first()
-    user_id = user_exist.id
-    character_exist = Character.query.filter_by(id=people_id).first()
-    if character_exist is None:
-        return jsonify({"msg": "This character doesn't exist"}), 400
-    else:
-        favorite_character_to_delete = FavoriteCharacter.query.filter_by(character_id=people_id, user_id=user_id).first()
-        if favorite_character_to_delete:
-            db.session.delete(favorite_character_to_delete)
-            db.session.commit()
-            return jsonify({"msg": "Character deleted to favorites"}), 200
-        else:  
-            return ({"msg": "This character doesn't exist in favorites"}), 400
-      
+    user_id = current_user_id()
+    if not delete_favorite(FavoriteCharacter, FavoriteCharacter.character_id, user_id, people_id):
+        return jsonify({"msg": "This character doesn't exist in favorites"}), 400
+    invalidate_favorites(user_id)
+    pin_to_primary(user_id)
+    return jsonify({"msg": "Character deleted to favorites"}), 200
+
 @app.route('/planets', methods=['GET'])
+@replica_reads
+@conditional_get(Planet)
 def get_all_planets():
-    all_planets = Planet.query.all()
-    all_planets_list = list(map(lambda item:item.serialize(), all_planets))
-    if all_planets_list == []:
+    if wants_stream(request):
+        return stream_ndjson(Planet, request.args)
+    response_body = catalog_cache.get_or_set(
+        catalog_key(Planet, "list", request.query_string),
+        lambda: list_page(Planet, request.args)
+    )
+    if response_body is None:
         return jsonify({"msg":"Planets not found"}), 404
-    response_body = {
-        "msg": "ok",
-        "results": all_planets_list
-    }
     return jsonify(response_body), 200
 
 @app.route('/planets/<int:planets_id>', methods=['GET'])
+@replica_reads
+@conditional_get(Planet)
 def get_one_planet(planets_id):
-    planet = Planet.query.get(planets_id)
+    fields = selected_fields(Planet, request.args)
+    planet = catalog_cache.get_or_set(catalog_key(Planet, planets_id, fields), lambda: get_serialized(Planet, planets_id, fields))
     if planet is None:
         return jsonify({"msg":"Planet not exist"}), 404
-    return jsonify(planet.serialize()), 200
+    return jsonify(planet), 200
 
 @app.route('/planets', methods=['POST'])
+@rate_limit("write")
 def create_one_planet():
     body = request.json
     planet = Planet.query.filter_by(name=body["name"]).first()
@@ -224,72 +330,87 @@ def create_one_planet():
         return jsonify({"msg": "Planet has already exist"}), 201
 
 @app.route('/planets/<int:planets_id>', methods=['DELETE'])
+@rate_limit("write")
 def delete_planet(planets_id):
     planet_to_delete = Planet.query.filter_by(id=planets_id).first()
     if planet_to_delete:
         db.session.delete(planet_to_delete)
         db.session.commit()
+        invalidate_favorites()
         return jsonify({"msg": "Planet deleted"}), 200
     else:
         return jsonify({"msg": "Planet not found"}), 404 
 
+@app.route('/planets/bulk', methods=['POST'])
+@rate_limit("write")
+@query_budget(None)
+def create_bulk_planets():
+    items = parse_bulk_body(request)
+    results = bulk_create(Planet, items)
+    invalidate_catalog(Planet)
+    return jsonify({"msg": "ok", "results": results}), 200
+
+@app.route('/planets/bulk', methods=['DELETE'])
+@rate_limit("write")
+@query_budget(None)
+def delete_bulk_planets():
+    ids = parse_bulk_body(request)
+    results = bulk_delete(Planet, ids)
+    invalidate_catalog(Planet)
+    invalidate_favorites()
+    return jsonify({"msg": "ok", "results": results}), 200
+
 @app.route("/favorite/planet/<int:planet_id>", methods=["POST"])
+@rate_limit("write")
 @jwt_required()
 def add_favorite_planet(planet_id): 
-    email = get_jwt_identity()
-    user_exist = User.query.filter_by(email=email).first()
-    user_id = user_exist.id
-    planet_exist = Planet.query.filter_by(id=planet_id).first()
-    if planet_exist is None:
-        return ({"msg": "This planet doesn't exist"}), 400
-    else:
-        exist_favorite_planet = FavoritePlanet.query.filter_by(planet_id=planet_id, user_id=user_id).first()
-        if exist_favorite_planet is None:
-            new_favorite_planet = FavoritePlanet(planet_id=planet_id, user_id=user_id)
-            db.session.add(new_favorite_planet)
-            db.session.commit()
-            return jsonify({"msg": "Planet added to favorites"}), 201
-        else:  
-            return jsonify({'msg': 'Planet has already exist in favorites'}), 400
+    user_id = current_user_id()
+    result = insert_favorite(FavoritePlanet, FavoritePlanet.planet_id, user_id, planet_id)
+    if result == "missing":
+        return jsonify({"msg": "This planet doesn't exist"}), 400
+    if result == "exists":
+        return jsonify({'msg': 'Planet has already exist in favorites'}), 400
+    invalidate_favorites(user_id)
+    pin_to_primary(user_id)
+    return jsonify({"msg": "Planet added to favorites"}), 201
 
 @app.route('/favorite/planet/<int:planet_id>', methods=['DELETE'])
+@rate_limit("write")
 @jwt_required()
 def delete_favorite_planet(planet_id): 
-    email = get_jwt_identity()
-    user_exist = User.query.filter_by(email=email).first()
-    user_id = user_exist.id
-    planet_exist = Planet.query.filter_by(id=planet_id).first()
-    if planet_exist is None:
-        return jsonify({'msg': 'There are not favorites planets'}), 400
-    else:
-        favorite_planet_to_delete = FavoritePlanet.query.filter_by(planet_id=planet_id, user_id=user_id).first()
-        if favorite_planet_to_delete:
-            db.session.delete(favorite_planet_to_delete)
-            db.session.commit()
-            return jsonify({"msg": "Planet deleted to favorites"}), 200
-        else:  
-            return ({"msg": "This planet doesn't exist in favorites"}), 400
-        
+    user_id = current_user_id()
+    if not delete_favorite(FavoritePlanet, FavoritePlanet.planet_id, user_id, planet_id):
+        return jsonify({"msg": "This planet doesn't exist in favorites"}), 400
+    invalidate_favorites(user_id)
+    pin_to_primary(user_id)
+    return jsonify({"msg": "Planet deleted to favorites"}), 200
+
 @app.route('/vehicles', methods=['GET'])
+@replica_reads
+@conditional_get(Vehicle)
 def get_all_vehicles():
-    all_vehicles = Vehicle.query.all()
-    all_vehicles_list = list(map(lambda item:item.serialize(), all_vehicles))
-    if all_vehicles_list == []:
+    if wants_stream(request):
+        return stream_ndjson(Vehicle, request.args)
+    response_body = catalog_cache.get_or_set(
+        catalog_key(Vehicle, "list", request.query_string),
+        lambda: list_page(Vehicle, request.args)
+    )
+    if response_body is None:
         return jsonify({"msg":"Vehicles not found"}), 404
-    response_body = {
-        "msg": "ok",
-        "results": all_vehicles_list
-    }
     return jsonify(response_body), 200
 
 @app.route('/vehicles/<int:vehicles_id>', methods=['GET'])
+@replica_reads
+@conditional_get(Vehicle)
 def get_one_vehicle(vehicles_id):
-    vehicle = Vehicle.query.get(vehicles_id)
+    fields = selected_fields(Vehicle, request.args)
+    vehicle = catalog_cache.get_or_set(catalog_key(Vehicle, vehicles_id, fields), lambda: get_serialized(Vehicle, vehicles_id, fields))
     if vehicle is None:
         return jsonify({"msg":"Vehicle not exist"}), 404
-    return jsonify(vehicle.serialize()), 200
+    return jsonify(vehicle), 200
 
 @app.route('/vehicles', methods=['POST'])
+@rate_limit("write")
 def create_one_vehicle():
     body = request.json
     vehicle = Vehicle.query.filter_by(name=body["name"]).first()
@@ -304,51 +425,72 @@ def create_one_vehicle():
         return jsonify({"msg": "Vehicle has already exist"}), 201
 
 @app.route('/vehicles/<int:vehicles_id>', methods=['DELETE'])
+@rate_limit("write")
 def delete_vehicle(vehicles_id):
     vehicle_to_delete = Vehicle.query.filter_by(id=vehicles_id).first()
     if vehicle_to_delete:
         db.session.delete(vehicle_to_delete)
         db.session.commit()
+        invalidate_favorites()
         return jsonify({"msg": "Vehicle deleted"}), 200
     else:
         return jsonify({"msg": "Vehicle not found"}), 404 
 
+@app.route('/vehicles/bulk', methods=['POST'])
+@rate_limit("write")
+@query_budget(None)
+def create_bulk_vehicles():
+    items = parse_bulk_body(request)
+    results = bulk_create(Vehicle, items)
+    invalidate_catalog(Vehicle)
+    return jsonify({"msg": "ok", "results": results}), 200
+
+@app.route('/vehicles/bulk', methods=['DELETE'])
+@rate_limit("write")
+@query_budget(None)
+def delete_bulk_vehicles():
+    ids = parse_bulk_body(request)
+    results = bulk_delete(Vehicle, ids)
+    invalidate_catalog(Vehicle)
+    invalidate_favorites()
+    return jsonify({"msg": "ok", "results": results}), 200
+
 @app.route("/favorite/vehicle/<int:vehicle_id>", methods=["POST"])
+@rate_limit("write")
 @jwt_required()
 def add_favorite_vehicle(vehicle_id): 
-    email = get_jwt_identity()
-    user_exist = User.query.filter_by(email=email).first()
-    user_id = user_exist.id
-    vehicle_exist = Vehicle.query.filter_by(id=vehicle_id).first()
-    if vehicle_exist is None:
+    user_id = current_user_id()
+    result = insert_favorite(FavoriteVehicle, FavoriteVehicle.vehicle_id, user_id, vehicle_id)
+    if result == "missing":
         return jsonify({"msg": "This vehicle doesn't exist"}), 400
-    else:
-        exist_favorite_vehicle = FavoriteVehicle.query.filter_by(vehicle_id=vehicle_id, user_id=user_id).first()
-        if exist_favorite_vehicle is None:
-            new_favorite_vehicle = FavoriteVehicle(vehicle_id=vehicle_id, user_id=user_id)
-            db.session.add(new_favorite_vehicle)
-            db.session.commit()
-            return jsonify({"msg": "Vehicle added to favorites"}), 201
-        else:  
-            return jsonify({'msg': 'Vechile has already exist in favorites'}), 400
+    if result == "exists":
+        return jsonify({'msg': 'Vechile has already exist in favorites'}), 400
+    invalidate_favorites(user_id)
+    pin_to_primary(user_id)
+    return jsonify({"msg": "Vehicle added to favorites"}), 201
 
 @app.route('/favorite/vehicle/<int:vehicle_id>', methods=['DELETE'])
+@rate_limit("write")
 @jwt_required()
 def delete_favorite_vehicle(vehicle_id): 
-    email = get_jwt_identity()
-    user_exist = User.query.filter_by(email=email).first()
-    user_id = user_exist.id
-    vehicle_exist = Vehicle.query.filter_by(id=vehicle_id).first()
-    if vehicle_exist is None:
-        return ({"msg": "This vehicle doesn't exist"}), 400
-    else:
-        favorite_vehicle_to_delete = FavoriteVehicle.query.filter_by(vehicle_id=vehicle_id, user_id=user_id).first()
-        if favorite_vehicle_to_delete:
-            db.session.delete(favorite_vehicle_to_delete)
-            db.session.commit()
-            return jsonify({"msg": "Vehicle deleted to favorites"}), 200
-        else:  
-            return ({"msg": "This vehicle doesn't exist in favorites"}), 400
+    user_id = current_user_id()
+    if not delete_favorite(FavoriteVehicle, FavoriteVehicle.vehicle_id, user_id, vehicle_id):
+        return jsonify({"msg": "This vehicle doesn't exist in favorites"}), 400
+    invalidate_favorites(user_id)
+    pin_to_primary(user_id)
+    return jsonify({"msg": "Vehicle deleted to favorites"}), 200
+
+@app.cli.command("reconcile-favorites")
+def reconcile_favorites_command():
+    """Recount favorites_count on characters, planets and vehicles."""
+    repaired = reconcile_favorite_counts()
+    print("Repaired favorites_count: %s" % ", ".join("%d %s" % (count, kind) for kind, count in repaired.items()))
+
+@app.cli.command("backfill-favorites")
+def backfill_favorites_command():
+    """Copy per-kind favorites missing from the unified favorite table."""
+    copied = backfill_favorites()
+    print("Copied favorites: %s" % ", ".join("%d %s" % (count, kind) for kind, count in copied.items()))
 
 # this only runs if `$ python src/app.py` is executed
 if __name__ == '__main__':
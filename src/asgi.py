@@ -0,0 +1,159 @@
+# ASGI entry point, run it with: uvicorn asgi:application --app-dir src
+# Catalog reads (/people, /planets, /vehicles) are answered by async handlers
+# on an async engine so a worker keeps serving while queries are in flight.
+# Every other route is delegated to the Flask app in a thread pool.
+# Shared cache lookups (Redis, files) run in threads as well.
+
+import asyncio
+import re
+from urllib.parse import parse_qsl
+from asgiref.wsgi import WsgiToAsgi
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.http import parse_accept_header
+from app import app
+from cache import catalog_cache, catalog_key, compressed_cache
+from compression import COMPRESS_MIN_SIZE, compressors, negotiate_encoding
+from database import async_database_url, async_engine_options
+from models import Character, Planet, Vehicle, format_table_version, table_version_query
+from utils import APIException, CACHE_CONTROL, decode_cursor, encode_cursor, encode_json, parse_limit, selected_fields, serialize_columns, serialize_row
+
+CATALOG_ROUTES = {
+    "people": (Character, "Characters not found", "Character not exist"),
+    "planets": (Planet, "Planets not found", "Planet not exist"),
+    "vehicles": (Vehicle, "Vehicles not found", "Vehicle not exist"),
+}
+CATALOG_PATH = re.compile(r"^/(people|planets|vehicles)(?:/(\d+))?/?$")
+ASYNC_QUERY_ARGS = {"limit", "after", "fields"}
+
+engine = create_async_engine(
+    async_database_url(app.config["SQLALCHEMY_DATABASE_URI"]),
+    **async_engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
+)
+flask_application = WsgiToAsgi(app)
+
+def catalog_keys(model, *parts):
+    # catalog_key reads the generation from the shared cache, which may block
+    return [catalog_key(model, *key_parts) for key_parts in parts]
+
+async def load_version(conn, model, key):
+    version = catalog_cache.get(key)
+    if version is None:
+        version = format_table_version((await conn.execute(table_version_query(model))).one())
+        catalog_cache.set(key, version)
+    return version
+
+async def load_page(conn, model, args):
+    limit = parse_limit(args.get("limit"))
+    fields = selected_fields(model, args)
+    query = select(*serialize_columns(model, fields)).order_by(model.id).limit(limit + 1)
+    if args.get("after"):
+        query = query.where(model.id > decode_cursor(args["after"]))
+    rows = (await conn.execute(query)).all()
+    if rows == []:
+        return None
+    next_cursor = encode_cursor(rows[limit - 1].id) if len(rows) > limit else None
+    return {
+        "msg": "ok",
+        "results": [serialize_row(model, row, fields) for row in rows[:limit]],
+        "next": next_cursor
+    }
+
+async def load_one(conn, model, item_id, fields):
+    row = (await conn.execute(
+        select(*serialize_columns(model, fields)).where(model.id == item_id)
+    )).first()
+    return serialize_row(model, row, fields) if row is not None else None
+
+async def send_payload(send, status, payload, headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(payload)).encode()),
+            (b"access-control-allow-origin", b"*"),
+        ] + list(headers)
+    })
+    await send({"type": "http.response.body", "body": payload})
+
+async def send_json(send, status, body, headers=()):
+    await send_payload(send, status, encode_json(body) if body is not None else b"", headers)
+
+async def catalog_read(scope, send, match):
+    model, list_missing, one_missing = CATALOG_ROUTES[match.group(1)]
+    query_string = scope["query_string"]
+    args = dict(parse_qsl(query_string.decode()))
+    request_headers = dict(scope["headers"])
+    # Compressed bodies are cached under the same key as compress_response uses
+    full_path = scope["path"] + "?" + query_string.decode()
+    encoding = negotiate_encoding(parse_accept_header(request_headers.get(b"accept-encoding", b"").decode()))
+    try:
+        if match.group(2) is None:
+            key_parts = ("list", query_string)
+            missing = list_missing
+        else:
+            item_id = int(match.group(2))
+            fields = selected_fields(model, args)
+            key_parts = (item_id, fields)
+            missing = one_missing
+        version_key, key = await asyncio.to_thread(catalog_keys, model, ("version",), key_parts)
+        async with engine.connect() as conn:
+            version = await load_version(conn, model, version_key)
+            etag = 'W/"%s"' % version
+            cache_headers = [(b"etag", etag.encode()), (b"cache-control", CACHE_CONTROL.encode()), (b"vary", b"Accept, Accept-Encoding")]
+            if_none_match = request_headers.get(b"if-none-match", b"").decode()
+            tags = [tag.strip().replace("W/", "", 1) for tag in if_none_match.split(",")]
+            if etag[2:] in tags or if_none_match.strip() == "*":
+                return await send_json(send, 304, None, cache_headers)
+            if encoding is not None:
+                compressed = compressed_cache.get((encoding, full_path, version))
+                if compressed is not None:
+                    return await send_payload(send, 200, compressed, cache_headers + [(b"content-encoding", encoding.encode())])
+            body = catalog_cache.get(key)
+            if body is None:
+                if match.group(2) is None:
+                    body = await load_page(conn, model, args)
+                else:
+                    body = await load_one(conn, model, item_id, fields)
+    except APIException as error:
+        return await send_json(send, error.status_code, error.to_dict())
+    if body is None:
+        return await send_json(send, 404, {"msg": missing})
+    catalog_cache.set(key, body)
+    payload = encode_json(body)
+    if encoding is not None and len(payload) >= COMPRESS_MIN_SIZE:
+        payload = compressors[encoding](payload)
+        compressed_cache.set((encoding, full_path, version), payload)
+        cache_headers.append((b"content-encoding", encoding.encode()))
+    await send_payload(send, 200, payload, cache_headers)
+
+def is_async_read(scope):
+    if scope["method"] != "GET":
+        return None
+    args = {key for key, _ in parse_qsl(scope["query_string"].decode())}
+    if not args <= ASYNC_QUERY_ARGS:
+        return None
+    accept = dict(scope["headers"]).get(b"accept", b"")
+    if b"application/x-ndjson" in accept:
+        return None
+    return CATALOG_PATH.match(scope["path"])
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await engine.dispose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] == "http":
+        match = is_async_read(scope)
+        if match is not None:
+            return await catalog_read(scope, send, match)
+    await flask_application(scope, receive, send)
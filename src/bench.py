@@ -0,0 +1,389 @@
+# Benchmark harness, run it from the repo root with the same environment
+# (DATABASE_URL, JWT settings) as the server under test, started with
+# RATE_LIMIT_ENABLED=0 so the write and auth routes are not throttled:
+#   pipenv run bench seed --users 100 --catalog 1000 --favorites 10
+#   pipenv run bench run --url http://localhost:3000 --out bench.json
+#   pipenv run bench compare baseline.json bench.json
+#   pipenv run bench versus --workers 2 --out versus.json
+#   pipenv run bench serialize --rows 1000 10000 100000
+#   pipenv run bench passwords --concurrency 1 2 4 8
+# "seed" fills the database and writes a manifest of the ids it created,
+# "run" drives every route at fixed concurrency and reports RPS and
+# p50/p95/p99 latencies per route as JSON, "compare" flags regressions,
+# "versus" starts gunicorn (sync) and uvicorn (asgi.py) with the same
+# number of workers and runs the catalog reads against both, "serialize"
+# times the ORM serialize() + jsonify path against the column tuple + fast
+# encoder path in process, on a scratch SQLite database, "passwords" runs
+# login verifications at the configured scrypt cost (SCRYPT_N, SCRYPT_R,
+# SCRYPT_P) and hash pool size from that many threads.
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from utils import encode_cursor
+
+BENCH_PASSWORD = "bench-password"
+KINDS = [
+    # catalog route, favorite route
+    ("people", "people"),
+    ("planets", "planet"),
+    ("vehicles", "vehicle"),
+]
+
+def seed(args):
+    from flask_jwt_extended import create_access_token
+    from app import app
+    from models import db, User, Character, Planet, Vehicle, FavoriteCharacter, FavoritePlanet, FavoriteVehicle, reconcile_favorite_counts, backfill_favorites
+    from passwords import hash_password
+    from utils import chunks
+
+    models = {"people": (Character, FavoriteCharacter, "character_id"), "planets": (Planet, FavoritePlanet, "planet_id"), "vehicles": (Vehicle, FavoriteVehicle, "vehicle_id")}
+    prefix = "bench-%s" % uuid.uuid4().hex[:8]
+    # Rows the DELETE routes consume: one per request plus one bulk batch per request
+    disposable = args.requests * (1 + args.bulk_size)
+    manifest = {"prefix": prefix, "users": [], "catalog": {}, "disposable": {}}
+    with app.app_context():
+        db.create_all()
+        password = hash_password(BENCH_PASSWORD)
+        emails = ["%s-%d@example.com" % (prefix, index) for index in range(args.users)]
+        for _, chunk in chunks([{"email": email, "password": password} for email in emails]):
+            db.session.execute(db.insert(User), chunk)
+        users = db.session.execute(db.select(User.id, User.email).where(User.email.in_(emails)).order_by(User.id)).all()
+        manifest["users"] = [
+            {"id": user.id, "email": user.email, "token": create_access_token(identity=user.email, additional_claims={"user_id": user.id}, expires_delta=False)}
+            for user in users
+        ]
+        for route, (model, favorite, fk) in models.items():
+            names = ["%s-%s-%d" % (prefix, route, index) for index in range(args.catalog + disposable)]
+            for _, chunk in chunks([{"name": name, "description": "Seeded by bench.py"} for name in names]):
+                db.session.execute(db.insert(model), chunk)
+            ids = db.session.execute(db.select(model.id).where(model.name.like(prefix + "-%")).order_by(model.id)).scalars().all()
+            manifest["catalog"][route] = ids[:args.catalog]
+            manifest["disposable"][route] = ids[args.catalog:]
+            rows = [{"user_id": user.id, fk: entity_id} for user in users for entity_id in ids[:args.favorites]]
+            for _, chunk in chunks(rows):
+                db.session.execute(db.insert(favorite), chunk)
+        db.session.commit()
+        reconcile_favorite_counts()
+        backfill_favorites()
+    manifest["favorites"] = args.favorites
+    with open(args.manifest, "w") as f:
+        json.dump(manifest, f)
+    print("Seeded %d users, %d catalog rows and %d favorites per user and kind into %s" % (args.users, args.catalog, args.favorites, args.manifest))
+
+def scenarios(manifest, requests, bulk_size):
+    # (name, method, path(i), body(i), token(i)), POSTs run before the DELETEs
+    # that undo them so every request hits an existing row
+    users = manifest["users"]
+    prefix = manifest["prefix"] + "-" + uuid.uuid4().hex[:6]
+    user = lambda i: users[i % len(users)]
+    token = lambda i: user(i)["token"]
+    routes = [
+        ("GET /", "GET", lambda i: "/", None, None),
+        ("GET /users", "GET", lambda i: "/users", None, None),
+        ("GET /users/<id>", "GET", lambda i: "/users/%d" % user(i)["id"], None, None),
+        ("GET /users/favorites", "GET", lambda i: "/users/favorites", None, token),
+        ("GET /search", "GET", lambda i: "/search?q=Seeded", None, None),
+        ("GET /changes", "GET", lambda i: "/changes?limit=100", None, token),
+        ("POST /signup", "POST", lambda i: "/signup", lambda i: {"email": "%s-signup-%d@example.com" % (prefix, i), "password": BENCH_PASSWORD}, None),
+        ("POST /login", "POST", lambda i: "/login", lambda i: {"email": user(i)["email"], "password": BENCH_PASSWORD}, None),
+    ]
+    for route, favorite_route in KINDS:
+        catalog = manifest["catalog"][route]
+        disposable = manifest["disposable"][route]
+        # Favorites not seeded yet: user i % U takes entity favorites + i // U
+        free = lambda i, catalog=catalog: catalog[(manifest["favorites"] + i // len(users)) % len(catalog)]
+        routes += [
+            ("GET /%s" % route, "GET", lambda i, route=route: "/%s" % route, None, None),
+            ("GET /%s?after" % route, "GET", lambda i, route=route, catalog=catalog: "/%s?limit=20&after=%s" % (route, encode_cursor(catalog[i % len(catalog)])), None, None),
+            ("GET /leaderboard/%s" % route, "GET", lambda i, route=route: "/leaderboard/%s?limit=10" % route, None, None),
+            ("GET /%s/<id>" % route, "GET", lambda i, route=route, catalog=catalog: "/%s/%d" % (route, catalog[i % len(catalog)]), None, None),
+            ("POST /%s" % route, "POST", lambda i, route=route: "/%s" % route, lambda i, route=route: {"name": "%s-%s-%d" % (prefix, route, i), "description": "Created by bench.py"}, None),
+            ("DELETE /%s/<id>" % route, "DELETE", lambda i, route=route, disposable=disposable: "/%s/%d" % (route, disposable[i]), None, None),
+            ("POST /%s/bulk" % route, "POST", lambda i, route=route: "/%s/bulk" % route, lambda i, route=route: [{"name": "%s-%s-bulk-%d-%d" % (prefix, route, i, j)} for j in range(bulk_size)], None),
+            ("DELETE /%s/bulk" % route, "DELETE", lambda i, route=route: "/%s/bulk" % route, lambda i, disposable=disposable: disposable[requests + i * bulk_size:requests + (i + 1) * bulk_size], None),
+            ("POST /favorite/%s/<id>" % favorite_route, "POST", lambda i, route=favorite_route, free=free: "/favorite/%s/%d" % (route, free(i)), None, token),
+            ("DELETE /favorite/%s/<id>" % favorite_route, "DELETE", lambda i, route=favorite_route, free=free: "/favorite/%s/%d" % (route, free(i)), None, token),
+        ]
+    return routes
+
+def send(base_url, method, path, body, token):
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(base_url + path, data=data, method=method)
+    request.add_header("Accept-Encoding", "gzip")
+    if data is not None:
+        request.add_header("Content-Type", "application/json")
+    if token is not None:
+        request.add_header("Authorization", "Bearer " + token)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as error:
+        error.read()
+        status = error.code
+    except OSError:
+        status = 0
+    return status, time.perf_counter() - start
+
+def percentile(latencies, fraction):
+    return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+def run_route(args, method, path, body, token):
+    def one(i):
+        return send(args.url, method, path(i), body(i) if body else None, token(i) if token else None)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as executor:
+        results = list(executor.map(one, range(args.requests)))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for _, latency in results)
+    statuses = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "requests": len(results),
+        "errors": sum(1 for status, _ in results if status == 0 or status >= 500),
+        "statuses": statuses,
+        "rps": round(len(results) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2)
+    }
+
+def run(args):
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+    # Deletes consume the disposable rows, a second run needs a fresh seed
+    if len(manifest["disposable"]["people"]) < args.requests * (1 + args.bulk_size):
+        sys.exit("The manifest has too few disposable rows for this run, seed again with --requests %d --bulk-size %d" % (args.requests, args.bulk_size))
+    report = {
+        "url": args.url,
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "users": len(manifest["users"]),
+        "catalog": len(manifest["catalog"]["people"]),
+        "routes": {}
+    }
+    for name, method, path, body, token in scenarios(manifest, args.requests, args.bulk_size):
+        if args.only and args.only not in name:
+            continue
+        report["routes"][name] = run_route(args, method, path, body, token)
+        print("%-32s %9.2f rps  p50 %8.2f ms  p95 %8.2f ms  p99 %8.2f ms" % (
+            name, report["routes"][name]["rps"], report["routes"][name]["p50_ms"], report["routes"][name]["p95_ms"], report["routes"][name]["p99_ms"]
+        ), file=sys.stderr)
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+    print(output)
+
+# Routes answered by the async handlers of asgi.py
+VERSUS_ROUTES = re.compile(r"^GET /(people|planets|vehicles)(\?after|/<id>)?$")
+
+def start_server(command, url):
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit("%s exited with status %d" % (command[2], process.returncode))
+        status, _ = send(url, "GET", "/people?limit=1", None, None)
+        if status:
+            return process
+        time.sleep(0.2)
+    process.terminate()
+    sys.exit("%s did not start within 30 seconds" % command[2])
+
+def versus(args):
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+    servers = {
+        "sync": [sys.executable, "-m", "gunicorn", "wsgi", "--chdir", "src", "--workers", str(args.workers), "--bind", "127.0.0.1:%d" % args.sync_port],
+        "async": [sys.executable, "-m", "uvicorn", "asgi:application", "--app-dir", "src", "--workers", str(args.workers), "--port", str(args.async_port), "--log-level", "warning"],
+    }
+    urls = {"sync": "http://127.0.0.1:%d" % args.sync_port, "async": "http://127.0.0.1:%d" % args.async_port}
+    routes = [route for route in scenarios(manifest, args.requests, args.bulk_size) if VERSUS_ROUTES.match(route[0]) and (not args.only or args.only in route[0])]
+    report = {"workers": args.workers, "concurrency": args.concurrency, "requests": args.requests, "routes": {}}
+    for mode, command in servers.items():
+        process = start_server(command, urls[mode])
+        try:
+            args.url = urls[mode]
+            for name, method, path, body, token in routes:
+                report["routes"].setdefault(name, {})[mode] = run_route(args, method, path, body, token)
+        finally:
+            process.terminate()
+            process.wait()
+    for name, stats in report["routes"].items():
+        stats["rps_ratio"] = round(stats["async"]["rps"] / stats["sync"]["rps"], 2) if stats["sync"]["rps"] else None
+        print("%-24s sync %9.2f rps  p99 %8.2f ms   async %9.2f rps  p99 %8.2f ms   x%s" % (
+            name, stats["sync"]["rps"], stats["sync"]["p99_ms"], stats["async"]["rps"], stats["async"]["p99_ms"], stats["rps_ratio"]
+        ), file=sys.stderr)
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+    print(output)
+
+def best_time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def serialize(args):
+    # The app reads DATABASE_URL when imported, point it at a scratch file
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "serialize.db")
+    from flask.json.provider import DefaultJSONProvider
+    from app import app
+    from models import db, Character
+    from utils import chunks, encode_json, json_encoder_name, serialize_columns, serialize_row
+
+    report = {"encoder": json_encoder_name, "repeat": args.repeat, "rows": {}}
+    with app.app_context():
+        db.create_all()
+        rows = [{"name": "bench-character-%d" % index, "description": "Seeded by bench.py serialize"} for index in range(max(args.rows))]
+        for _, chunk in chunks(rows):
+            db.session.execute(db.insert(Character), chunk)
+        db.session.commit()
+        stdlib = DefaultJSONProvider(app)
+
+        for count in args.rows:
+            def old_rows():
+                db.session.remove()
+                return {"msg": "ok", "results": [row.serialize() for row in Character.query.order_by(Character.id).limit(count).all()]}
+
+            def new_rows():
+                db.session.remove()
+                query = Character.query.with_entities(*serialize_columns(Character)).order_by(Character.id).limit(count)
+                return {"msg": "ok", "results": [serialize_row(Character, row) for row in query.all()]}
+
+            old_load, old_body = best_time(old_rows, args.repeat)
+            old_encode, old_payload = best_time(lambda: stdlib.dumps(old_body), args.repeat)
+            new_load, new_body = best_time(new_rows, args.repeat)
+            new_encode, new_payload = best_time(lambda: encode_json(new_body), args.repeat)
+            assert json.loads(old_payload) == json.loads(new_payload)
+            report["rows"][count] = {
+                "old": {"load_ms": round(old_load * 1000, 2), "encode_ms": round(old_encode * 1000, 2), "total_ms": round((old_load + old_encode) * 1000, 2)},
+                "new": {"load_ms": round(new_load * 1000, 2), "encode_ms": round(new_encode * 1000, 2), "total_ms": round((new_load + new_encode) * 1000, 2)},
+                "speedup": round((old_load + old_encode) / (new_load + new_encode), 2)
+            }
+            print("%7d rows  old %9.2f ms (load %9.2f, encode %8.2f)  new %9.2f ms (load %9.2f, encode %8.2f)  x%.2f" % (
+                count, (old_load + old_encode) * 1000, old_load * 1000, old_encode * 1000,
+                (new_load + new_encode) * 1000, new_load * 1000, new_encode * 1000, report["rows"][count]["speedup"]
+            ), file=sys.stderr)
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+    print(output)
+
+def passwords(args):
+    from passwords import PASSWORD_HASH_CONCURRENCY, SCRYPT_N, SCRYPT_R, SCRYPT_P, check_password, hash_password
+    from utils import APIException
+
+    stored = hash_password(BENCH_PASSWORD)
+    def one(i):
+        start = time.perf_counter()
+        try:
+            valid, _ = check_password(stored, BENCH_PASSWORD)
+            status = 200 if valid else 401
+        except APIException as error:
+            status = error.status_code
+        return status, time.perf_counter() - start
+
+    report = {"scrypt": {"n": SCRYPT_N, "r": SCRYPT_R, "p": SCRYPT_P}, "pool": PASSWORD_HASH_CONCURRENCY, "logins": args.logins, "concurrency": {}}
+    for concurrency in args.concurrency:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = list(executor.map(one, range(args.logins)))
+        elapsed = time.perf_counter() - start
+        latencies = sorted(latency for _, latency in results)
+        stats = report["concurrency"][concurrency] = {
+            "logins_per_second": round(len(results) / elapsed, 2),
+            "busy": sum(1 for status, _ in results if status == 503),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2)
+        }
+        print("%3d threads %9.2f logins/s  p50 %8.2f ms  p99 %8.2f ms  %d busy" % (
+            concurrency, stats["logins_per_second"], stats["p50_ms"], stats["p99_ms"], stats["busy"]
+        ), file=sys.stderr)
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+    print(output)
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)["routes"]
+    with open(args.current) as f:
+        current = json.load(f)["routes"]
+    threshold = args.threshold / 100
+    regressions = []
+    for name, stats in current.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if stats["rps"] < before["rps"] * (1 - threshold):
+            regressions.append({"route": name, "metric": "rps", "baseline": before["rps"], "current": stats["rps"]})
+        for metric in ("p95_ms", "p99_ms"):
+            if stats[metric] > before[metric] * (1 + threshold):
+                regressions.append({"route": name, "metric": metric, "baseline": before[metric], "current": stats[metric]})
+        if stats["errors"] > before["errors"]:
+            regressions.append({"route": name, "metric": "errors", "baseline": before["errors"], "current": stats["errors"]})
+    print(json.dumps({"threshold_percent": args.threshold, "regressions": regressions}, indent=2))
+    if regressions:
+        sys.exit(1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed, load test and compare benchmark runs of the API")
+    commands = parser.add_subparsers(dest="command", required=True)
+    seed_parser = commands.add_parser("seed")
+    seed_parser.add_argument("--users", type=int, default=100)
+    seed_parser.add_argument("--catalog", type=int, default=1000, help="rows per catalog table")
+    seed_parser.add_argument("--favorites", type=int, default=10, help="favorites per user and kind")
+    run_parser = commands.add_parser("run")
+    run_parser.add_argument("--url", default="http://localhost:3000")
+    run_parser.add_argument("--concurrency", type=int, default=8)
+    run_parser.add_argument("--only", help="only run the routes whose name contains this text")
+    run_parser.add_argument("--out")
+    versus_parser = commands.add_parser("versus")
+    versus_parser.add_argument("--workers", type=int, default=2, help="workers of each server, keep it at the core count")
+    versus_parser.add_argument("--sync-port", type=int, default=3001)
+    versus_parser.add_argument("--async-port", type=int, default=3002)
+    versus_parser.add_argument("--concurrency", type=int, default=32)
+    versus_parser.add_argument("--only", help="only run the routes whose name contains this text")
+    versus_parser.add_argument("--out")
+    for command_parser in (seed_parser, run_parser, versus_parser):
+        command_parser.add_argument("--manifest", default="bench_seed.json")
+        command_parser.add_argument("--requests", type=int, default=200, help="requests per route")
+        command_parser.add_argument("--bulk-size", type=int, default=20)
+    serialize_parser = commands.add_parser("serialize")
+    serialize_parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    serialize_parser.add_argument("--repeat", type=int, default=3, help="runs per measurement, the fastest is reported")
+    serialize_parser.add_argument("--out")
+    passwords_parser = commands.add_parser("passwords")
+    passwords_parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8], help="threads verifying at once")
+    passwords_parser.add_argument("--logins", type=int, default=100, help="verifications per concurrency level")
+    passwords_parser.add_argument("--out")
+    compare_parser = commands.add_parser("compare")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=10, help="allowed change in percent")
+    args = parser.parse_args()
+    {"seed": seed, "run": run, "compare": compare, "versus": versus, "serialize": serialize, "passwords": passwords}[args.command](args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+import fcntl
+import hashlib
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+FAVORITES_CACHE_SIZE = int(os.getenv("FAVORITES_CACHE_SIZE", 10000))
+FAVORITES_CACHE_TTL = int(os.getenv("FAVORITES_CACHE_TTL", 300))
+IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", 10000))
+IDENTITY_CACHE_TTL = int(os.getenv("IDENTITY_CACHE_TTL", 300))
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", 10000))
+CATALOG_CACHE_TTL = int(os.getenv("CATALOG_CACHE_TTL", 60))
+COMPRESSED_CACHE_SIZE = int(os.getenv("COMPRESSED_CACHE_SIZE", 1000))
+CACHE_URL = os.getenv("CACHE_URL", "memory://")
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "starwars:")
+# Seconds the read replicas may lag behind the primary: reads right after a
+# write go to the primary, so a lagging replica cannot fill the caches of
+# the new generation with old rows
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", 5))
+# Seconds between sweeps of the expired keys (rate limit buckets) of the
+# memory and file backends, Redis expires them by itself
+CACHE_PURGE_INTERVAL = int(os.getenv("CACHE_PURGE_INTERVAL", 60))
+
+class LRUCache:
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_set(self, key, loader):
+        # Missing results (None) are not cached
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        return {
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+def refill(state, rate, burst, now):
+    # Token bucket step: returns the new state and the seconds to wait
+    # before retrying (0 when a token was taken)
+    tokens, updated = state or (burst, now)
+    tokens = min(burst, tokens + max(0, now - updated) * rate)
+    if tokens >= 1:
+        return (tokens - 1, now), 0
+    return (tokens, now), (1 - tokens) / rate
+
+class MemoryBackend:
+    # Per-process backend, only coherent with a single worker
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.Lock()
+        self.purged_at = time.time()
+
+    def purge_expired(self, now):
+        # Called with the lock held, sweeps at most once per interval so
+        # writes stay O(1) amortized
+        if now - self.purged_at < CACHE_PURGE_INTERVAL:
+            return
+        self.purged_at = now
+        expired = [key for key, (_, expires_at) in self.data.items() if expires_at is not None and expires_at <= now]
+        for key in expired:
+            del self.data[key]
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    def get_many(self, keys):
+        now = time.time()
+        values = []
+        with self.lock:
+            for key in keys:
+                value, expires_at = self.data.get(key, (None, None))
+                values.append(value if expires_at is None or expires_at > now else None)
+        return values
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        with self.lock:
+            self.purge_expired(now)
+            self.data[key] = (value, now + ttl if ttl else None)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def incr(self, key):
+        with self.lock:
+            value = (self.data.get(key, (0, None))[0] or 0) + 1
+            self.data[key] = (value, None)
+            return value
+
+    def take_token(self, key, rate, burst):
+        now = time.time()
+        with self.lock:
+            self.purge_expired(now)
+            state, expires_at = self.data.get(key, (None, None))
+            if expires_at is not None and expires_at <= now:
+                state = None
+            state, retry_after = refill(state, rate, burst, now)
+            self.data[key] = (state, now + math.ceil(burst / rate))
+        return retry_after
+
+class FileBackend:
+    # Shares values between the workers of one host through a directory,
+    # point it at tmpfs (/dev/shm) to keep it in memory
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.lock_path = os.path.join(path, ".lock")
+        self.purged_at = time.time()
+
+    def purge_expired(self, now):
+        # Called with the lock file held, each worker sweeps the directory
+        # at most once per interval
+        if now - self.purged_at < CACHE_PURGE_INTERVAL:
+            return
+        self.purged_at = now
+        for name in os.listdir(self.path):
+            if name.startswith(".") or name.endswith(".tmp"):
+                continue
+            path = os.path.join(self.path, name)
+            try:
+                with open(path) as f:
+                    expires_at = json.load(f)["expires_at"]
+                if expires_at is not None and expires_at < now:
+                    os.remove(path)
+            except (FileNotFoundError, ValueError, KeyError):
+                pass
+
+    def _file(self, key):
+        return os.path.join(self.path, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._file(key)) as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if data["expires_at"] is not None and data["expires_at"] < time.time():
+            return None
+        return data["value"]
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ttl=None):
+        # Each writer gets its own temp file, threads of one worker included
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"value": value, "expires_at": time.time() + ttl if ttl else None}, f)
+        os.replace(tmp_path, self._file(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self._file(key))
+        except FileNotFoundError:
+            pass
+
+    def incr(self, key):
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            value = (self.get(key) or 0) + 1
+            self.set(key, value)
+            return value
+
+    def take_token(self, key, rate, burst):
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            now = time.time()
+            self.purge_expired(now)
+            state, retry_after = refill(self.get(key), rate, burst, now)
+            self.set(key, state, ttl=math.ceil(burst / rate))
+            return retry_after
+
+TOKEN_BUCKET_SCRIPT = """
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local retry_after = 0
+if tokens >= 1 then tokens = tokens - 1 else retry_after = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate))
+return tostring(retry_after)
+"""
+
+class RedisBackend:
+    # Shares values between every worker and node, a client speaking the
+    # Redis protocol (or a fake one) can be passed in directly
+    def __init__(self, url, client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    def get_many(self, keys):
+        return [json.loads(value) if value is not None else None for value in self.client.mget(keys)]
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, json.dumps(value), ex=ttl)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def incr(self, key):
+        return self.client.incr(key)
+
+    def take_token(self, key, rate, burst):
+        # One atomic script call per request, shared by every worker
+        return float(self.client.eval(TOKEN_BUCKET_SCRIPT, 1, key, rate, burst, time.time()))
+
+def create_backend(url):
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    if url.startswith("file://"):
+        return FileBackend(url[len("file://"):])
+    return MemoryBackend()
+
+# Shared by every worker: holds the generation counters used to invalidate
+# the local caches below after a write handled by any worker
+shared_cache = create_backend(CACHE_URL)
+
+# (user_id, generations) -> favorites with embedded entities, as returned by get_user_favorites
+favorites_cache = LRUCache(FAVORITES_CACHE_SIZE, FAVORITES_CACHE_TTL)
+
+# email -> user_id
+identity_cache = LRUCache(IDENTITY_CACHE_SIZE, IDENTITY_CACHE_TTL)
+
+# serialized catalog entities, list pages and table versions
+catalog_cache = LRUCache(CATALOG_CACHE_SIZE, CATALOG_CACHE_TTL)
+
+# (encoding, full path, etag) -> compressed response body
+compressed_cache = LRUCache(COMPRESSED_CACHE_SIZE, CATALOG_CACHE_TTL)
+
+def generation_key(name):
+    return CACHE_KEY_PREFIX + "generation:" + name
+
+def written_key(name):
+    return CACHE_KEY_PREFIX + "written:" + name
+
+def bump_generation(name):
+    shared_cache.incr(generation_key(name))
+    if READ_YOUR_WRITES_SECONDS > 0:
+        shared_cache.set(written_key(name), 1, ttl=READ_YOUR_WRITES_SECONDS)
+
+def recently_written(*names):
+    # True while any of these generations was bumped less than
+    # READ_YOUR_WRITES_SECONDS ago
+    return any(shared_cache.get_many([written_key(name) for name in names]))
+
+def favorites_key(user_id):
+    generations = shared_cache.get_many([generation_key("favorites"), generation_key("favorites:%d" % user_id)])
+    return (user_id,) + tuple(generation or 0 for generation in generations)
+
+def invalidate_favorites(user_id=None):
+    if user_id is None:
+        bump_generation("favorites")
+    else:
+        # The user's own reads are pinned to the primary by pin_to_primary
+        shared_cache.incr(generation_key("favorites:%d" % user_id))
+
+def get_cached_identity(email):
+    return identity_cache.get(email)
+
+def set_cached_identity(email, user_id):
+    identity_cache.set(email, user_id)
+
+def catalog_key(model, *parts):
+    table = model.__tablename__
+    return (table, shared_cache.get(generation_key(table)) or 0) + parts
+
+def invalidate_catalog(model):
+    bump_generation(model.__tablename__)
+
+def cache_stats():
+    return {
+        "catalog": catalog_cache.stats(),
+        "compressed": compressed_cache.stats(),
+        "favorites": favorites_cache.stats(),
+        "identity": identity_cache.stats()
+    }
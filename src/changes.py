@@ -0,0 +1,88 @@
+import base64
+import json
+import os
+from datetime import datetime, timedelta
+from models import db, Character, Planet, Vehicle, Favorite, Tombstone, utcnow
+from utils import APIException, parse_limit
+
+# Changes younger than this are left for the next sync: updated_at is
+# stamped before commit, so a slow transaction (or a lagging replica) could
+# otherwise land a row behind a token that was already handed out
+CHANGES_SETTLE_SECONDS = int(os.getenv("CHANGES_SETTLE_SECONDS", 5))
+
+EPOCH = datetime(1970, 1, 1)
+
+def encode_token(positions):
+    # {stream: (timestamp, id)} of the last change returned on each stream
+    raw = json.dumps({stream: [timestamp.isoformat(), row_id] for stream, (timestamp, row_id) in positions.items()})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_token(token):
+    if not token:
+        return {}
+    try:
+        padding = "=" * (-len(token) % 4)
+        raw = json.loads(base64.urlsafe_b64decode(token + padding).decode())
+        return {stream: (datetime.fromisoformat(timestamp), int(row_id)) for stream, (timestamp, row_id) in raw.items()}
+    except (ValueError, TypeError, AttributeError, UnicodeDecodeError):
+        raise APIException("Invalid since token", status_code=400)
+
+def catalog_change(row):
+    return {"id": row.id, "name": row.name, "description": row.description, "updated_at": row.updated_at.isoformat()}
+
+def favorite_change(row):
+    return {"id": row.id, "kind": row.kind, "entity_id": row.entity_id, "updated_at": row.updated_at.isoformat()}
+
+def deleted_change(row):
+    return {"table": row.table_name, "id": row.row_id, "deleted_at": row.deleted_at.isoformat()}
+
+def change_streams(user_id):
+    # name -> (query, timestamp column, id column, serializer), each read
+    # in (timestamp, id) order from its index
+    streams = {
+        name: (db.select(model.id, model.name, model.description, model.updated_at), model.updated_at, model.id, catalog_change)
+        for name, model in (("people", Character), ("planets", Planet), ("vehicles", Vehicle))
+    }
+    streams["deleted"] = (
+        db.select(Tombstone.id, Tombstone.table_name, Tombstone.row_id, Tombstone.deleted_at).where(Tombstone.user_id.is_(None)),
+        Tombstone.deleted_at, Tombstone.id, deleted_change
+    )
+    if user_id is not None:
+        streams["favorites"] = (
+            db.select(Favorite.id, Favorite.kind, Favorite.entity_id, Favorite.updated_at).where(Favorite.user_id == user_id),
+            Favorite.updated_at, Favorite.id, favorite_change
+        )
+        streams["deleted_favorites"] = (
+            db.select(Tombstone.id, Tombstone.table_name, Tombstone.row_id, Tombstone.deleted_at).where(Tombstone.user_id == user_id),
+            Tombstone.deleted_at, Tombstone.id, deleted_change
+        )
+    return streams
+
+def changes_page(args, user_id=None):
+    # Rows created, modified or deleted after the since token, at most
+    # limit per stream; "more" asks the client to follow up with "next"
+    positions = decode_token(args.get("since"))
+    limit = parse_limit(args.get("limit"))
+    until = utcnow() - timedelta(seconds=CHANGES_SETTLE_SECONDS)
+    changes = {}
+    more = False
+    for name, (query, timestamp, row_id, serialize) in change_streams(user_id).items():
+        last_timestamp, last_id = positions.get(name, (EPOCH, 0))
+        rows = db.session.execute(
+            query.where(
+                db.or_(timestamp > last_timestamp, db.and_(timestamp == last_timestamp, row_id > last_id)),
+                timestamp <= until
+            ).order_by(timestamp, row_id).limit(limit + 1)
+        ).all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            more = True
+        changes[name] = [serialize(row) for row in rows]
+        if rows:
+            positions[name] = (getattr(rows[-1], timestamp.key), rows[-1].id)
+    return {
+        "msg": "ok",
+        "changes": changes,
+        "next": encode_token(positions),
+        "more": more
+    }
@@ -0,0 +1,72 @@
+import gzip
+import os
+from flask import current_app, request
+from cache import compressed_cache
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+COMPRESS_MIMETYPES = {"application/json"}
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 5))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", 3))
+
+compressors = {
+    "gzip": lambda data: gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+}
+try:
+    import brotli
+    compressors["br"] = lambda data: brotli.compress(data, quality=BROTLI_QUALITY)
+except ImportError:
+    pass
+try:
+    import zstandard
+    compressors["zstd"] = lambda data: zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+except ImportError:
+    pass
+
+# Server preference between encodings the client accepts with the same quality
+ENCODING_PREFERENCE = ["zstd", "br", "gzip"]
+
+def negotiate_encoding(accept_encodings=None):
+    # Parsed Accept-Encoding of the current Flask request unless given (ASGI)
+    if accept_encodings is None:
+        accept_encodings = request.accept_encodings
+    best, best_quality = None, 0
+    for encoding in ENCODING_PREFERENCE:
+        if encoding in compressors:
+            quality = accept_encodings.quality(encoding)
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+    return best
+
+def cached_compressed_response(etag):
+    # Bodies compressed for a given URL and ETag are reused as long as the
+    # ETag holds, skipping serialization and compression altogether
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return None
+    body = compressed_cache.get((encoding, request.full_path, etag))
+    if body is None:
+        return None
+    response = current_app.response_class(body, mimetype="application/json")
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
+
+def compress_response(response):
+    if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+            or "Content-Encoding" in response.headers or response.mimetype not in COMPRESS_MIMETYPES):
+        return response
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+    body = compressors[encoding](data)
+    etag, _ = response.get_etag()
+    if etag is not None:
+        compressed_cache.set((encoding, request.full_path, etag), body)
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    return response
@@ -0,0 +1,177 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+from functools import wraps
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite.aiosqlite import AsyncAdapt_aiosqlite_connection
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+from cache import CACHE_KEY_PREFIX, READ_YOUR_WRITES_SECONDS, recently_written, shared_cache
+
+# Total connections the database accepts from this service, split between
+# the gunicorn workers (WEB_CONCURRENCY) when no explicit pool size is given
+DB_MAX_CONNECTIONS = os.getenv("DB_MAX_CONNECTIONS")
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+DB_POOL_SIZE = os.getenv("DB_POOL_SIZE")
+DB_MAX_OVERFLOW = os.getenv("DB_MAX_OVERFLOW")
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 10))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 15000))
+
+# Comma separated read replicas, GET handlers marked with @replica_reads use them
+DATABASE_REPLICA_URLS = [url.strip().replace("postgres://", "postgresql://") for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_BIND_KEYS = ["replica_%d" % index for index in range(len(DATABASE_REPLICA_URLS))]
+
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", -20000))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 268435456))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+
+pool_stats = {
+    "checkouts": 0,
+    "timeouts": 0,
+    "wait_seconds_total": 0.0,
+    "wait_seconds_max": 0.0
+}
+pool_stats_lock = threading.Lock()
+
+class TimedQueuePool(QueuePool):
+    # Records how long requests wait for a free connection
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            with pool_stats_lock:
+                pool_stats["timeouts"] += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with pool_stats_lock:
+                pool_stats["checkouts"] += 1
+                pool_stats["wait_seconds_total"] += waited
+                pool_stats["wait_seconds_max"] = max(pool_stats["wait_seconds_max"], waited)
+
+def pool_options(database_url):
+    if database_url.startswith("sqlite") and ":memory:" in database_url:
+        return {}
+    if DB_POOL_SIZE is not None:
+        pool_size = int(DB_POOL_SIZE)
+    elif DB_MAX_CONNECTIONS is not None:
+        pool_size = max(1, int(DB_MAX_CONNECTIONS) // WEB_CONCURRENCY)
+    else:
+        pool_size = 5
+    if DB_MAX_OVERFLOW is not None:
+        max_overflow = int(DB_MAX_OVERFLOW)
+    else:
+        max_overflow = 0 if DB_MAX_CONNECTIONS is not None else 5
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING
+    }
+
+def connect_args(database_url):
+    # Statement timeout and SQLite busy timeout in each driver's terms
+    args = {}
+    if DB_STATEMENT_TIMEOUT_MS > 0:
+        if database_url.startswith("postgresql+asyncpg"):
+            args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+        elif database_url.startswith("postgresql"):
+            args["options"] = "-c statement_timeout=%d" % DB_STATEMENT_TIMEOUT_MS
+        elif database_url.startswith("mysql"):
+            args["init_command"] = "SET SESSION MAX_EXECUTION_TIME=%d" % DB_STATEMENT_TIMEOUT_MS
+    if database_url.startswith("sqlite"):
+        args["timeout"] = SQLITE_BUSY_TIMEOUT_MS / 1000
+    return args
+
+def engine_options(database_url):
+    options = pool_options(database_url)
+    if options:
+        options["poolclass"] = TimedQueuePool
+    args = connect_args(database_url)
+    if args:
+        options["connect_args"] = args
+    return options
+
+def async_database_url(url):
+    if url.startswith("postgresql://"):
+        return "postgresql+asyncpg://" + url[len("postgresql://"):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+def async_engine_options(database_url):
+    # Same settings as engine_options for the async drivers, on the
+    # default async pool
+    options = pool_options(database_url)
+    args = connect_args(async_database_url(database_url))
+    if args:
+        options["connect_args"] = args
+    return options
+
+def get_pool_stats(engine):
+    with pool_stats_lock:
+        stats = dict(pool_stats)
+    stats["status"] = engine.pool.status()
+    return stats
+
+def replica_binds():
+    return {
+        key: dict(url=url, **engine_options(url))
+        for key, url in zip(REPLICA_BIND_KEYS, DATABASE_REPLICA_URLS)
+    }
+
+class RoutingSession(Session):
+    # Sends the queries of read-only handlers to a random replica,
+    # everything else (and anything flushed) goes to the primary
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and REPLICA_BIND_KEYS and not self._flushing and has_app_context() and g.get("use_replica"):
+            return self._db.engines[random.choice(REPLICA_BIND_KEYS)]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def replica_reads(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.use_replica = True
+        return view(*args, **kwargs)
+    return wrapper
+
+def use_primary():
+    g.use_replica = False
+
+def primary_after_writes(*names):
+    # Cached reads of tables invalidated moments ago are filled from the
+    # primary, a lagging replica would cache old rows under the new generation
+    if REPLICA_BIND_KEYS and recently_written(*names):
+        use_primary()
+
+def pin_to_primary(user_id):
+    # Read-your-writes: replicas may lag behind the write that just happened
+    if REPLICA_BIND_KEYS:
+        shared_cache.set(CACHE_KEY_PREFIX + "primary:%d" % user_id, 1, ttl=READ_YOUR_WRITES_SECONDS)
+
+def is_pinned_to_primary(user_id):
+    return bool(REPLICA_BIND_KEYS) and shared_cache.get(CACHE_KEY_PREFIX + "primary:%d" % user_id) is not None
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # SQLite only enforces foreign keys when asked to, favorites rely on them.
+    # WAL lets readers run while a worker writes. aiosqlite connections
+    # (asgi.py) arrive wrapped in SQLAlchemy's adapter
+    if isinstance(dbapi_connection, (sqlite3.Connection, AsyncAdapt_aiosqlite_connection)):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.execute("PRAGMA journal_mode=%s" % SQLITE_JOURNAL_MODE)
+        cursor.execute("PRAGMA synchronous=%s" % SQLITE_SYNCHRONOUS)
+        cursor.execute("PRAGMA cache_size=%d" % SQLITE_CACHE_SIZE)
+        cursor.execute("PRAGMA mmap_size=%d" % SQLITE_MMAP_SIZE)
+        cursor.close()
@@ -0,0 +1,186 @@
+import hmac
+import os
+import threading
+import time
+from collections import Counter
+from functools import wraps
+from flask import Response, current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from cache import cache_stats
+from database import pool_stats, pool_stats_lock
+from utils import APIException
+
+# Excess query detector for development and tests: "log" warns, "raise"
+# fails the request once it runs more than QUERY_BUDGET statements or the
+# same statement QUERY_REPEAT_LIMIT times (the usual sign of an N+1)
+QUERY_DEBUG = os.getenv("QUERY_DEBUG", "")
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", 10))
+QUERY_REPEAT_LIMIT = int(os.getenv("QUERY_REPEAT_LIMIT", 3))
+
+# Bearer token the scraper sends to /metrics, /cache/stats and /db/stats.
+# Without it those endpoints answer 404
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+lock = threading.Lock()
+in_flight = 0
+# route -> [bucket counts..., +Inf count, sum]
+latency = {}
+sql_per_request = {}
+# (route, method, status) -> count
+responses = {}
+# route -> [statements, seconds]
+sql_totals = {}
+
+def observe(histograms, buckets, route, value):
+    histogram = histograms.get(route)
+    if histogram is None:
+        histogram = histograms[route] = [0] * (len(buckets) + 1) + [0.0]
+    for index, bound in enumerate(buckets):
+        if value <= bound:
+            histogram[index] += 1
+            break
+    else:
+        histogram[len(buckets)] += 1
+    histogram[-1] += value
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context() and "sql_count" in g:
+        g.sql_started = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def end_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context() and "sql_count" in g:
+        g.sql_count += 1
+        g.sql_seconds += time.perf_counter() - g.sql_started
+        if QUERY_DEBUG:
+            check_queries(statement)
+
+def query_budget(budget):
+    # Overrides QUERY_BUDGET for a view known to need more statements,
+    # None exempts views whose statements grow with the payload (bulk)
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            g.query_budget = budget
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def check_queries(statement):
+    # Statements are compared as compiled, with their parameters left out
+    budget = g.query_budget if "query_budget" in g else QUERY_BUDGET
+    if budget is None:
+        return
+    g.sql_shapes[statement] += 1
+    if g.sql_count == budget + 1:
+        report_queries("%s %s ran more than %d SQL statements" % (request.method, request.path, budget))
+    if g.sql_shapes[statement] == QUERY_REPEAT_LIMIT:
+        report_queries("%s %s ran the same statement %d times: %s" % (request.method, request.path, QUERY_REPEAT_LIMIT, statement))
+
+def report_queries(message):
+    if QUERY_DEBUG == "raise":
+        raise APIException(message, status_code=500, payload={"statements": dict(g.sql_shapes)})
+    current_app.logger.warning(message)
+
+def internal_only(view):
+    # Marked views are also left out of the sitemap
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not METRICS_TOKEN:
+            raise APIException("Not found", status_code=404)
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+            raise APIException("Missing or invalid metrics token", status_code=401)
+        return view(*args, **kwargs)
+    wrapper.internal = True
+    return wrapper
+
+def start_request():
+    global in_flight
+    g.request_started = time.perf_counter()
+    g.sql_count = 0
+    g.sql_seconds = 0.0
+    g.sql_shapes = Counter()
+    with lock:
+        in_flight += 1
+
+def record_request(response):
+    if "request_started" not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    with lock:
+        observe(latency, LATENCY_BUCKETS, route, elapsed)
+        observe(sql_per_request, SQL_COUNT_BUCKETS, route, g.sql_count)
+        key = (route, request.method, response.status_code)
+        responses[key] = responses.get(key, 0) + 1
+        totals = sql_totals.setdefault(route, [0, 0.0])
+        totals[0] += g.sql_count
+        totals[1] += g.sql_seconds
+    return response
+
+def finish_request(error=None):
+    global in_flight
+    if "request_started" in g:
+        with lock:
+            in_flight -= 1
+
+def format_histogram(lines, name, buckets, histograms):
+    lines.append("# TYPE %s histogram" % name)
+    for route, histogram in histograms.items():
+        cumulative = 0
+        for bound, count in zip(buckets, histogram):
+            cumulative += count
+            lines.append('%s_bucket{route="%s",le="%s"} %d' % (name, route, bound, cumulative))
+        cumulative += histogram[len(buckets)]
+        lines.append('%s_bucket{route="%s",le="+Inf"} %d' % (name, route, cumulative))
+        lines.append('%s_sum{route="%s"} %s' % (name, route, histogram[-1]))
+        lines.append('%s_count{route="%s"} %d' % (name, route, cumulative))
+
+def render_metrics():
+    lines = []
+    with lock:
+        lines.append("# TYPE http_requests_in_flight gauge")
+        lines.append("http_requests_in_flight %d" % in_flight)
+        format_histogram(lines, "http_request_duration_seconds", LATENCY_BUCKETS, latency)
+        format_histogram(lines, "http_request_sql_statements", SQL_COUNT_BUCKETS, sql_per_request)
+        lines.append("# TYPE http_responses_total counter")
+        for (route, method, status), count in responses.items():
+            lines.append('http_responses_total{route="%s",method="%s",status="%d"} %d' % (route, method, status, count))
+        lines.append("# TYPE sql_statements_total counter")
+        for route, (statements, seconds) in sql_totals.items():
+            lines.append('sql_statements_total{route="%s"} %d' % (route, statements))
+        lines.append("# TYPE sql_seconds_total counter")
+        for route, (statements, seconds) in sql_totals.items():
+            lines.append('sql_seconds_total{route="%s"} %s' % (route, seconds))
+    caches = cache_stats()
+    for counter in ("hits", "misses", "evictions"):
+        lines.append("# TYPE cache_%s_total counter" % counter)
+        for name, stats in caches.items():
+            lines.append('cache_%s_total{cache="%s"} %d' % (counter, name, stats[counter]))
+    lines.append("# TYPE cache_size gauge")
+    for name, stats in caches.items():
+        lines.append('cache_size{cache="%s"} %d' % (name, stats["size"]))
+    with pool_stats_lock:
+        lines.append("# TYPE db_pool_checkouts_total counter")
+        lines.append("db_pool_checkouts_total %d" % pool_stats["checkouts"])
+        lines.append("# TYPE db_pool_timeouts_total counter")
+        lines.append("db_pool_timeouts_total %d" % pool_stats["timeouts"])
+        lines.append("# TYPE db_pool_wait_seconds_total counter")
+        lines.append("db_pool_wait_seconds_total %s" % pool_stats["wait_seconds_total"])
+    return "\n".join(lines) + "\n"
+
+def setup_metrics(app):
+    app.before_request(start_request)
+    app.after_request(record_request)
+    app.teardown_request(finish_request)
+
+    @app.route('/metrics', methods=['GET'])
+    @internal_only
+    def get_metrics():
+        return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
@@ -1,15 +1,28 @@
+from datetime import datetime, timezone
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import object_session
+from cache import invalidate_catalog
+from database import RoutingSession
+from utils import BULK_BATCH_SIZE, chunks, serialize_columns, serialize_row
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+def utcnow():
+    # Naive UTC, the timestamp columns have no time zone
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 class User(db.Model):
     __tablename__ = 'user'
     id = db.Column(db.Integer, primary_key=True) 
     email = db.Column(db.String(250), unique=True, nullable=False)
-    password = db.Column(db.String(50), nullable=False)
+    password = db.Column(db.String(255), nullable=False)
     favorites_characters = db.relationship('FavoriteCharacter', backref='users', lazy=True)
     favorites_planets = db.relationship('FavoritePlanet', backref='users', lazy=True)
     favorites_vehicles = db.relationship('FavoriteVehicle', backref='users', lazy=True)
+    serialize_columns = ("id", "email")
 
     def __repr__(self):
         return '<User %r>' % self.email
@@ -22,10 +35,19 @@ class User(db.Model):
 
 class Character(db.Model):
     __tablename__ = 'character'
+    __table_args__ = (
+        db.Index('ix_character_favorites_count', 'favorites_count', 'id'),
+        db.Index('ix_character_updated_at_id', 'updated_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(50), nullable=False)
+    name = db.Column(db.String(50), nullable=False, index=True)
     description = db.Column(db.String(500), nullable=True)
+    # Kept in step by insert_favorite/delete_favorite, repaired by reconcile_favorite_counts
+    favorites_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # Position in the /changes feed, counter bumps leave it alone
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow, onupdate=utcnow)
     favorites_characters = db.relationship('FavoriteCharacter', backref='characters', lazy=True)
+    serialize_columns = ("id", "name", "description")
 
     def __repr__(self):
         return '<Character %r>' % self.name
@@ -39,9 +61,10 @@ class Character(db.Model):
 
 class FavoriteCharacter(db.Model):
     __tablename__ = 'favorite_character'
+    __table_args__ = (db.Index('ix_favorite_character_user_id_character_id', 'user_id', 'character_id', unique=True),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    character_id = db.Column(db.Integer, db.ForeignKey('character.id'))
+    character_id = db.Column(db.Integer, db.ForeignKey('character.id'), index=True)
 
     def __repr__(self):
         return '<FavoriteCharacter %r>' % self.id
@@ -55,10 +78,19 @@ class FavoriteCharacter(db.Model):
 
 class Planet(db.Model):
     __tablename__ = 'planet'
+    __table_args__ = (
+        db.Index('ix_planet_favorites_count', 'favorites_count', 'id'),
+        db.Index('ix_planet_updated_at_id', 'updated_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(50), nullable=False)
+    name = db.Column(db.String(50), nullable=False, index=True)
     description = db.Column(db.String(500), nullable=True)
+    # Kept in step by insert_favorite/delete_favorite, repaired by reconcile_favorite_counts
+    favorites_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # Position in the /changes feed, counter bumps leave it alone
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow, onupdate=utcnow)
     favorites_planets = db.relationship('FavoritePlanet', backref='planets', lazy=True)
+    serialize_columns = ("id", "name", "description")
 
     def __repr__(self):
         return '<Planet %r>' % self.name
@@ -72,9 +104,10 @@ class Planet(db.Model):
 
 class FavoritePlanet(db.Model):
     __tablename__ = 'favorite_planet'
+    __table_args__ = (db.Index('ix_favorite_planet_user_id_planet_id', 'user_id', 'planet_id', unique=True),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    planet_id = db.Column(db.Integer, db.ForeignKey('planet.id'))
+    planet_id = db.Column(db.Integer, db.ForeignKey('planet.id'), index=True)
 
     def __repr__(self):
         return '<FavoritePlanet %r>' % self.id
@@ -88,10 +121,19 @@ class FavoritePlanet(db.Model):
 
 class Vehicle(db.Model):
     __tablename__ = 'vehicle'
+    __table_args__ = (
+        db.Index('ix_vehicle_favorites_count', 'favorites_count', 'id'),
+        db.Index('ix_vehicle_updated_at_id', 'updated_at', 'id'),
+    )
     id = db.Column(db.Integer, nullable=False, primary_key=True)
-    name = db.Column(db.String(50), nullable=False)
+    name = db.Column(db.String(50), nullable=False, index=True)
     description = db.Column(db.String(500), nullable=True)
+    # Kept in step by insert_favorite/delete_favorite, repaired by reconcile_favorite_counts
+    favorites_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # Position in the /changes feed, counter bumps leave it alone
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow, onupdate=utcnow)
     favorites_vehicles = db.relationship('FavoriteVehicle', backref='vehicles', lazy=True)
+    serialize_columns = ("id", "name", "description")
 
     def __repr__(self):
         return '<Vehicle %r>' % self.name
@@ -106,9 +148,10 @@ class Vehicle(db.Model):
 
 class FavoriteVehicle(db.Model):
     __tablename__ = 'favorite_vehicle'
+    __table_args__ = (db.Index('ix_favorite_vehicle_user_id_vehicle_id', 'user_id', 'vehicle_id', unique=True),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicle.id'))
+    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicle.id'), index=True)
 
     def __repr__(self):
         return '<FavoriteVehicle %r>' % self.id
@@ -120,8 +163,406 @@ class FavoriteVehicle(db.Model):
             "vehicle_id": self.vehicle_id
         }
 
+class Favorite(db.Model):
+    # Every favorite of every kind in one table, dual-written with the
+    # per-kind tables above while they are phased out
+    __tablename__ = 'favorite'
+    __table_args__ = (
+        db.Index('ix_favorite_user_id_kind_entity_id', 'user_id', 'kind', 'entity_id', unique=True),
+        # Covers /users/favorites: one range scan, already in favorite order
+        db.Index('ix_favorite_user_id_id_kind_entity_id', 'user_id', 'id', 'kind', 'entity_id'),
+        db.Index('ix_favorite_user_id_updated_at_id', 'user_id', 'updated_at', 'id'),
+        # Finds the favorites of a deleted character/planet/vehicle
+        db.Index('ix_favorite_kind_entity_id', 'kind', 'entity_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow, onupdate=utcnow)
+
+    def __repr__(self):
+        return '<Favorite %r>' % self.id
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "kind": self.kind,
+            "entity_id": self.entity_id
+        }
+
+# Text search configuration of the PostgreSQL tsvector indexes
+TS_CONFIG = db.text("'simple'")
+
+def search_document(model):
+    # The expression of the ix_<table>_search GIN indexes, queries must use it
+    # as is. Literals are text() so the index attaches to the model's table
+    return db.func.to_tsvector(TS_CONFIG, model.name.op("||")(db.text("' '")).op("||")(db.func.coalesce(model.description, db.text("''"))))
+
+for model in (Character, Planet, Vehicle):
+    table = model.__tablename__
+    # name_prefix lookups, see search.name_prefix_filter
+    db.Index('ix_%s_lower_name' % table, db.func.lower(model.name).label('lower_name'), postgresql_ops={'lower_name': 'text_pattern_ops'})
+    # Full-text search on PostgreSQL, SQLite uses the FTS5 tables of search.py
+    db.Index('ix_%s_search' % table, search_document(model), postgresql_using='gin').ddl_if(dialect='postgresql')
+
+class Tombstone(db.Model):
+    # Deleted catalog rows (user_id is NULL) and favorites, so /changes can
+    # report deletions while every other read keeps working on live rows only
+    __tablename__ = 'tombstone'
+    __table_args__ = (
+        db.Index('ix_tombstone_user_id_deleted_at_id', 'user_id', 'deleted_at', 'id'),
+        db.Index('ix_tombstone_table_name_id', 'table_name', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(50), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=True)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+    def __repr__(self):
+        return '<Tombstone %r>' % self.id
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "table": self.table_name,
+            "row_id": self.row_id,
+            "deleted_at": self.deleted_at.isoformat()
+        }
+
+class TableVersion(db.Model):
+    # One counter per catalog table, bumped in the transaction of every write
+    # to it so the ETags change even when count(*) and max(id) do not
+    # (SQLite reuses ids, admin edits keep both)
+    __tablename__ = 'table_version'
+    table_name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    def __repr__(self):
+        return '<TableVersion %r>' % self.table_name
+
+VERSIONED_MODELS = (Character, Planet, Vehicle)
+
+event.listen(TableVersion.__table__, "after_create", DDL(
+    "INSERT INTO table_version (table_name, version) VALUES %s" % ", ".join("('%s', 0)" % model.__tablename__ for model in VERSIONED_MODELS)
+))
+
+def bump_table_version(model, connection=None):
+    statement = db.update(TableVersion).where(TableVersion.table_name == model.__tablename__).values(version=TableVersion.version + 1)
+    (connection or db.session).execute(statement)
+
+def bump_orm_version(mapper, connection, target):
+    # Writes through the ORM (single routes, admin). The catalog caches are
+    # invalidated once the write commits, admin edits included
+    bump_table_version(mapper.class_, connection)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_models", set()).add(mapper.class_)
+
+def invalidate_changed_models(session):
+    for model in session.info.pop("changed_models", ()):
+        invalidate_catalog(model)
+
+def forget_changed_models(session):
+    session.info.pop("changed_models", None)
+
+for model in VERSIONED_MODELS:
+    for name in ("after_insert", "after_update", "after_delete"):
+        event.listen(model, name, bump_orm_version)
+event.listen(RoutingSession, "after_commit", invalidate_changed_models)
+event.listen(RoutingSession, "after_rollback", forget_changed_models)
+
+def table_version_query(model):
+    # Version stamp of a catalog table for its ETag: the write counter, plus
+    # the newest updated_at and tombstone in case rows were written by hand
+    name = model.__tablename__
+    return db.select(
+        db.literal(name),
+        db.select(TableVersion.version).where(TableVersion.table_name == name).scalar_subquery(),
+        db.select(db.func.max(model.updated_at)).scalar_subquery(),
+        db.select(db.func.max(Tombstone.id)).where(Tombstone.table_name == name).scalar_subquery()
+    )
+
+def format_table_version(row):
+    name, version, updated_at, tombstone_id = row
+    return "%s-%d-%s-%d" % (name, version or 0, updated_at.isoformat() if updated_at else "0", tombstone_id or 0)
+
+def table_version(model):
+    return format_table_version(db.session.execute(table_version_query(model)).one())
+
+def record_deletes(model, ids, user_id=None):
+    # Called in the deleting transaction, rolled back with it
+    if ids:
+        db.session.execute(db.insert(Tombstone), [
+            {"table_name": model.__tablename__, "row_id": row_id, "user_id": user_id, "deleted_at": utcnow()}
+            for row_id in ids
+        ])
+
+def record_orm_delete(mapper, connection, target):
+    # Deletes through the ORM (single delete routes, admin)
+    connection.execute(db.insert(Tombstone).values(
+        table_name=target.__tablename__, row_id=target.id, user_id=getattr(target, "user_id", None), deleted_at=utcnow()
+    ))
+
+def delete_entity_favorites(model, ids, connection=None):
+    # entity_id has no foreign key, so the unified favorites of deleted
+    # characters/planets/vehicles are removed (and tombstoned for their
+    # users' /changes) by the deleting transaction itself
+    executor = connection if connection is not None else db.session
+    kind = ENTITY_KIND_NAMES[model]
+    rows = executor.execute(
+        db.select(Favorite.id, Favorite.user_id).where(Favorite.kind == kind, Favorite.entity_id.in_(ids))
+    ).all()
+    if rows:
+        executor.execute(db.delete(Favorite).where(Favorite.id.in_([row.id for row in rows])))
+        executor.execute(db.insert(Tombstone), [
+            {"table_name": Favorite.__tablename__, "row_id": row.id, "user_id": row.user_id, "deleted_at": utcnow()}
+            for row in rows
+        ])
+
+def delete_orm_entity_favorites(mapper, connection, target):
+    delete_entity_favorites(mapper.class_, [target.id], connection)
+
+for model in (Character, Planet, Vehicle, Favorite):
+    event.listen(model, "after_delete", record_orm_delete)
+for model in (Character, Planet, Vehicle):
+    event.listen(model, "after_delete", delete_orm_entity_favorites)
+
+def get_serialized(model, item_id, fields=None):
+    row = model.query.with_entities(*serialize_columns(model, fields)).filter(model.id == item_id).first()
+    return serialize_row(model, row, fields) if row is not None else None
+
+FAVORITE_KINDS = [
+    ("character", FavoriteCharacter, FavoriteCharacter.character_id, Character),
+    ("planet", FavoritePlanet, FavoritePlanet.planet_id, Planet),
+    ("vehicle", FavoriteVehicle, FavoriteVehicle.vehicle_id, Vehicle),
+]
+
+def get_user_favorites(user_id):
+    # One range scan of the user's favorites, each joined to its
+    # character/planet/vehicle by primary key
+    query = db.select(Favorite.id, Favorite.kind, Favorite.entity_id)
+    for kind, _, _, entity in FAVORITE_KINDS:
+        query = query.outerjoin(entity, db.and_(Favorite.kind == kind, entity.id == Favorite.entity_id))
+    query = query.add_columns(
+        db.func.coalesce(*[entity.name for _, _, _, entity in FAVORITE_KINDS]).label("name"),
+        db.func.coalesce(*[entity.description for _, _, _, entity in FAVORITE_KINDS]).label("description")
+    )
+    rows = db.session.execute(query.where(Favorite.user_id == user_id).order_by(Favorite.id)).all()
+    results = {kind: [] for kind, _, _, _ in FAVORITE_KINDS}
+    for row in rows:
+        if row.kind not in results or row.name is None:
+            continue
+        results[row.kind].append({
+            "id": row.id,
+            "user_id": user_id,
+            row.kind + "_id": row.entity_id,
+            row.kind: {
+                "id": row.entity_id,
+                "name": row.name,
+                "description": row.description
+            }
+        })
+    return [results[kind] for kind, _, _, _ in FAVORITE_KINDS]
+
+FAVORITE_ENTITIES = {favorite: entity for _, favorite, _, entity in FAVORITE_KINDS}
+FAVORITE_KIND_NAMES = {favorite: kind for kind, favorite, _, _ in FAVORITE_KINDS}
+ENTITY_KIND_NAMES = {entity: kind for kind, _, _, entity in FAVORITE_KINDS}
+
+def change_favorites_count(favorite, entity_id, delta):
+    entity = FAVORITE_ENTITIES[favorite]
+    db.session.execute(
+        db.update(entity).where(entity.id == entity_id).values(favorites_count=entity.favorites_count + delta, updated_at=entity.updated_at)
+    )
+
+def insert_ignoring_duplicates(model, values, index_elements):
+    # INSERT that skips rows already present in the unique index, None on
+    # dialects without ON CONFLICT DO NOTHING
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model).values(**values).on_conflict_do_nothing(index_elements=index_elements)
+    if dialect == "sqlite":
+        return sqlite.insert(model).values(**values).on_conflict_do_nothing(index_elements=index_elements)
+    return None
+
+def insert_unified_favorite(favorite, user_id, entity_id):
+    # The row may already have been copied by a concurrent backfill, which
+    # must not fail the whole favorite insert
+    kind = FAVORITE_KIND_NAMES[favorite]
+    statement = insert_ignoring_duplicates(
+        Favorite, {"user_id": user_id, "kind": kind, "entity_id": entity_id}, ["user_id", "kind", "entity_id"]
+    )
+    if statement is None:
+        exists = db.select(Favorite.id).where(Favorite.user_id == user_id, Favorite.kind == kind, Favorite.entity_id == entity_id).exists()
+        statement = db.insert(Favorite).from_select(
+            ["user_id", "kind", "entity_id"],
+            db.select(db.literal(user_id), db.literal(kind), db.literal(entity_id)).where(~exists)
+        )
+    db.session.execute(statement)
+
+def insert_favorite(favorite, entity_fk, user_id, entity_id):
+    # Single INSERT that skips duplicates through the unique index, a missing
+    # entity is reported by its foreign key. Returns "created", "exists" or "missing".
+    # The unified favorite row and the entity's favorites_count are written
+    # in the same transaction
+    values = {"user_id": user_id, entity_fk.key: entity_id}
+    dialect = db.session.get_bind().dialect.name
+    statement = insert_ignoring_duplicates(favorite, values, ["user_id", entity_fk.key])
+    if statement is None:
+        # MySQL's INSERT IGNORE would also swallow foreign key errors,
+        # so other dialects insert plainly and inspect the failure
+        statement = db.insert(favorite).values(**values)
+    try:
+        result = db.session.execute(statement)
+        if result.rowcount == 1:
+            insert_unified_favorite(favorite, user_id, entity_id)
+            change_favorites_count(favorite, entity_id, 1)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        if dialect in ("postgresql", "sqlite"):
+            return "missing"
+        exists = db.session.execute(
+            db.select(favorite.id).filter_by(**values)
+        ).first()
+        return "exists" if exists else "missing"
+    return "created" if result.rowcount == 1 else "exists"
+
+def delete_favorite(favorite, entity_fk, user_id, entity_id):
+    result = db.session.execute(
+        db.delete(favorite).where(favorite.user_id == user_id, entity_fk == entity_id)
+    )
+    unified_ids = db.session.execute(
+        db.select(Favorite.id).where(Favorite.user_id == user_id, Favorite.kind == FAVORITE_KIND_NAMES[favorite], Favorite.entity_id == entity_id)
+    ).scalars().all()
+    if unified_ids:
+        db.session.execute(db.delete(Favorite).where(Favorite.id.in_(unified_ids)))
+        record_deletes(Favorite, unified_ids, user_id)
+    if result.rowcount == 1:
+        change_favorites_count(favorite, entity_id, -1)
+    db.session.commit()
+    return result.rowcount > 0
+
+def backfill_favorites(batch_size=None):
+    # Copies per-kind favorites missing from the unified table, one short
+    # transaction per batch of source ids. Safe to run again at any time
+    batch_size = batch_size or BULK_BATCH_SIZE
+    copied = {}
+    for kind, favorite, entity_fk, _ in FAVORITE_KINDS:
+        copied[kind] = 0
+        last_id = 0
+        while True:
+            ids = db.session.execute(
+                db.select(favorite.id).where(favorite.id > last_id).order_by(favorite.id).limit(batch_size)
+            ).scalars().all()
+            if ids == []:
+                break
+            missing = ~db.select(Favorite.id).where(
+                Favorite.user_id == favorite.user_id, Favorite.kind == kind, Favorite.entity_id == entity_fk
+            ).exists()
+            result = db.session.execute(
+                db.insert(Favorite).from_select(
+                    ["user_id", "kind", "entity_id"],
+                    db.select(favorite.user_id, db.literal(kind), entity_fk).where(
+                        favorite.id.between(ids[0], ids[-1]), favorite.user_id.isnot(None), entity_fk.isnot(None), missing
+                    ).order_by(favorite.id)
+                )
+            )
+            db.session.commit()
+            copied[kind] += result.rowcount
+            last_id = ids[-1]
+    return copied
 
+def reconcile_favorite_counts():
+    # Repairs favorites_count drift (admin edits, manual SQL) with one
+    # correlated UPDATE per kind, touching only the rows that are wrong
+    repaired = {}
+    for kind, favorite, entity_fk, entity in FAVORITE_KINDS:
+        actual = db.select(db.func.count(favorite.id)).where(entity_fk == entity.id).scalar_subquery()
+        result = db.session.execute(
+            db.update(entity).where(entity.favorites_count != actual).values(favorites_count=actual, updated_at=entity.updated_at)
+        )
+        repaired[kind] = result.rowcount
+    db.session.commit()
+    return repaired
 
+def get_leaderboard(model, limit):
+    # Served by the (favorites_count, id) index, read backwards
+    rows = db.session.execute(
+        db.select(model.id, model.name, model.favorites_count).order_by(model.favorites_count.desc(), model.id.desc()).limit(limit)
+    ).all()
+    return [{"id": row.id, "name": row.name, "favorites_count": row.favorites_count} for row in rows]
 
+def bulk_create(model, items):
+    # Names are checked with one IN (...) query per chunk and new rows are
+    # written with a single executemany INSERT, committing once per chunk
+    results = [None] * len(items)
+    seen_names = set()
+    for start, chunk in chunks(items):
+        rows = []
+        names = [item.get("name") for item in chunk if isinstance(item, dict) and isinstance(item.get("name"), str)]
+        existing = set(db.session.execute(
+            db.select(model.name).where(model.name.in_(names))
+        ).scalars())
+        for offset, item in enumerate(chunk):
+            index = start + offset
+            if not isinstance(item, dict) or not isinstance(item.get("name"), str) or not item["name"]:
+                results[index] = {"index": index, "status": "invalid"}
+                continue
+            name = item["name"]
+            if name in existing or name in seen_names:
+                results[index] = {"index": index, "name": name, "status": "exists"}
+                continue
+            seen_names.add(name)
+            rows.append({"name": name, "description": item.get("description")})
+            results[index] = {"index": index, "name": name, "status": "created"}
+        if rows:
+            db.session.execute(db.insert(model), rows)
+            bump_table_version(model)
+        db.session.commit()
+    return results
 
+def is_row_id(item):
+    # JSON true/false arrive as bool, which is an int subclass
+    return isinstance(item, int) and not isinstance(item, bool)
 
+def bulk_delete(model, ids):
+    # Ids still referenced by favorites are kept and reported as conflicts
+    # (one IN (...) query per favorite table), the rest of the chunk is
+    # deleted with a single statement
+    results = []
+    for start, chunk in chunks(ids):
+        valid_ids = [item for item in chunk if is_row_id(item)]
+        found = set(db.session.execute(
+            db.select(model.id).where(model.id.in_(valid_ids))
+        ).scalars())
+        referenced = set()
+        for _, favorite, entity_fk, entity in FAVORITE_KINDS:
+            if entity is model and found:
+                referenced.update(db.session.execute(
+                    db.select(entity_fk).where(entity_fk.in_(found)).distinct()
+                ).scalars())
+        deletable = found - referenced
+        try:
+            if deletable:
+                db.session.execute(db.delete(model).where(model.id.in_(deletable)))
+                record_deletes(model, deletable)
+                delete_entity_favorites(model, deletable)
+                bump_table_version(model)
+            db.session.commit()
+        except IntegrityError:
+            # Favorited between the check and the delete, keep the chunk
+            db.session.rollback()
+            referenced = found
+        for item in chunk:
+            if not is_row_id(item):
+                results.append({"id": item, "status": "invalid"})
+            elif item in referenced:
+                results.append({"id": item, "status": "conflict"})
+            elif item in found:
+                results.append({"id": item, "status": "deleted"})
+            else:
+                results.append({"id": item, "status": "not found"})
+    return results
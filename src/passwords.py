@@ -0,0 +1,60 @@
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils import APIException
+
+# scrypt cost, raising any of them rehashes passwords on the next login
+SCRYPT_N = int(os.getenv("SCRYPT_N", 2 ** 14))
+SCRYPT_R = int(os.getenv("SCRYPT_R", 8))
+SCRYPT_P = int(os.getenv("SCRYPT_P", 1))
+# Hashes computed at once per worker, others wait up to PASSWORD_HASH_TIMEOUT seconds
+PASSWORD_HASH_CONCURRENCY = int(os.getenv("PASSWORD_HASH_CONCURRENCY", 2))
+PASSWORD_HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", 5))
+
+# hashlib.scrypt releases the GIL, so other request threads keep running
+executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_CONCURRENCY, thread_name_prefix="password-hash")
+slots = threading.BoundedSemaphore(PASSWORD_HASH_CONCURRENCY)
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r + 1024 * 1024, dklen=32)
+
+def _encode(salt, digest, n, r, p):
+    return "scrypt$%d$%d$%d$%s$%s" % (
+        n, r, p,
+        base64.b64encode(salt).decode(),
+        base64.b64encode(digest).decode()
+    )
+
+def _run(function, *args):
+    if not slots.acquire(timeout=PASSWORD_HASH_TIMEOUT):
+        raise APIException("Server busy, try again later", status_code=503)
+    try:
+        return executor.submit(function, *args).result()
+    finally:
+        slots.release()
+
+def _hash(password):
+    salt = os.urandom(16)
+    return _encode(salt, _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P), SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+def _verify(stored, password):
+    if not stored.startswith("scrypt$"):
+        # Legacy plaintext row, upgraded by the caller
+        return hmac.compare_digest(stored.encode(), password.encode()), True
+    _, n, r, p, salt, digest = stored.split("$")
+    n, r, p = int(n), int(r), int(p)
+    computed = _scrypt(password, base64.b64decode(salt), n, r, p)
+    valid = hmac.compare_digest(computed, base64.b64decode(digest))
+    return valid, (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+def hash_password(password):
+    return _run(_hash, password)
+
+def check_password(stored, password):
+    # Returns (valid, needs_rehash)
+    if not stored or not password:
+        return False, False
+    return _run(_verify, stored, password)
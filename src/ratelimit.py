@@ -0,0 +1,70 @@
+import math
+import os
+import threading
+from functools import wraps
+from flask import jsonify, request
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+from cache import CACHE_KEY_PREFIX, shared_cache
+
+# Budgets as "<requests>/<seconds>": the bucket holds <requests> tokens and
+# refills at <requests>/<seconds> per second, per route and client
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+RATE_LIMITS = {
+    "auth": os.getenv("RATE_LIMIT_AUTH", "10/60"),
+    "write": os.getenv("RATE_LIMIT_WRITE", "60/60"),
+}
+# Requests one client may have running at once in a worker
+RATE_LIMIT_CONCURRENCY = int(os.getenv("RATE_LIMIT_CONCURRENCY", 4))
+# Reverse proxies in front of the app (Render has one), their
+# X-Forwarded-For entries are trusted to find the client address.
+# Set it to 0 when clients reach the app directly
+PROXY_COUNT = int(os.getenv("PROXY_COUNT", 1))
+
+in_flight = {}
+in_flight_lock = threading.Lock()
+
+def parse_budget(budget):
+    requests, seconds = budget.split("/")
+    return int(requests) / float(seconds), int(requests)
+
+def client_key():
+    # Authenticated clients are limited per user, everyone else per address
+    try:
+        if verify_jwt_in_request(optional=True) is not None:
+            claims = get_jwt()
+            return "user:%s" % claims.get("user_id", claims["sub"])
+    except Exception:
+        pass
+    if PROXY_COUNT and len(request.access_route) >= PROXY_COUNT:
+        return "ip:" + request.access_route[-PROXY_COUNT]
+    return "ip:%s" % request.remote_addr
+
+def too_many_requests(retry_after):
+    response = jsonify({"msg": "Too many requests"})
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response, 429
+
+def rate_limit(budget):
+    rate, burst = parse_budget(RATE_LIMITS[budget])
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not RATE_LIMIT_ENABLED:
+                return view(*args, **kwargs)
+            client = client_key()
+            retry_after = shared_cache.take_token(CACHE_KEY_PREFIX + "ratelimit:%s:%s" % (request.endpoint, client), rate, burst)
+            if retry_after:
+                return too_many_requests(retry_after)
+            with in_flight_lock:
+                if in_flight.get(client, 0) >= RATE_LIMIT_CONCURRENCY:
+                    return too_many_requests(1)
+                in_flight[client] = in_flight.get(client, 0) + 1
+            try:
+                return view(*args, **kwargs)
+            finally:
+                with in_flight_lock:
+                    in_flight[client] -= 1
+                    if in_flight[client] == 0:
+                        del in_flight[client]
+        return wrapper
+    return decorator
@@ -0,0 +1,87 @@
+from sqlalchemy import DDL, event, func, literal_column
+from models import db, Character, Planet, Vehicle, TS_CONFIG, search_document
+from utils import APIException, decode_cursor, encode_cursor, parse_limit, selected_fields, serialize_columns, serialize_page, serialize_row
+
+SEARCHABLE_MODELS = {
+    "people": Character,
+    "planets": Planet,
+    "vehicles": Vehicle,
+}
+
+def fts_table(model):
+    # SQLite FTS5 index kept in sync with the model table by triggers
+    name = model.__tablename__ + "_fts"
+    return db.table(name, db.column("rowid"), db.column(name))
+
+def fts_ddl(model):
+    table = model.__tablename__
+    fts = table + "_fts"
+    return [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(name, description, content='{table}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        "CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN "
+        "INSERT INTO {fts}(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+        "CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN "
+        "INSERT INTO {fts}({fts}, rowid, name, description) VALUES ('delete', old.id, old.name, old.description); END",
+        "CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF name, description ON {table} BEGIN "
+        "INSERT INTO {fts}({fts}, rowid, name, description) VALUES ('delete', old.id, old.name, old.description); "
+        "INSERT INTO {fts}(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+        "INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ], {"table": table, "fts": fts}
+
+for model in SEARCHABLE_MODELS.values():
+    statements, names = fts_ddl(model)
+    for statement in statements:
+        event.listen(model.__table__, "after_create", DDL(statement.format(**names)).execute_if(dialect="sqlite"))
+
+def fts5_query(q):
+    # Every word is quoted (no FTS syntax from clients) and prefix matched
+    return " ".join('"%s"*' % word.replace('"', '""') for word in q.split())
+
+def name_prefix_filter(model, prefix):
+    prefix = prefix.lower()
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    lower_name = func.lower(model.name)
+    # The range lets the lower(name) index serve the lookup on every dialect
+    return db.and_(lower_name >= prefix, lower_name < prefix + "\U0010ffff", lower_name.like(escaped + "%", escape="\\"))
+
+def search_page(model, args, *criteria):
+    # Ranked full-text search, paginated with an offset cursor
+    q = args.get("q", "").strip()
+    if not q:
+        raise APIException("Missing search query", status_code=400)
+    limit = parse_limit(args.get("limit"))
+    offset = decode_cursor(args["after"]) if args.get("after") else 0
+    fields = selected_fields(model, args)
+    query = model.query.with_entities(*serialize_columns(model, fields)).filter(*criteria)
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        ts_query = func.websearch_to_tsquery(TS_CONFIG, q)
+        document = search_document(model)
+        query = query.filter(document.op("@@")(ts_query)).order_by(func.ts_rank(document, ts_query).desc(), model.id)
+    elif dialect == "sqlite":
+        fts = fts_table(model)
+        match = fts5_query(q)
+        if not match:
+            return None
+        query = query.join(fts, fts.c.rowid == model.id).filter(
+            fts.c[fts.name].op("MATCH")(match)
+        ).order_by(func.bm25(literal_column(fts.name)), model.id)
+    else:
+        pattern = "%" + q + "%"
+        query = query.filter(db.or_(model.name.ilike(pattern), model.description.ilike(pattern))).order_by(model.id)
+    rows = query.offset(offset).limit(limit + 1).all()
+    if rows == []:
+        return None
+    return {
+        "msg": "ok",
+        "results": [serialize_row(model, row, fields) for row in rows[:limit]],
+        "next": encode_cursor(offset + limit) if len(rows) > limit else None
+    }
+
+def list_page(model, args):
+    criteria = []
+    if args.get("name_prefix"):
+        criteria.append(name_prefix_filter(model, args["name_prefix"]))
+    if args.get("q"):
+        return search_page(model, args, *criteria)
+    return serialize_page(model, args, *criteria)
@@ -1,4 +1,49 @@
-from flask import jsonify, url_for
+import base64
+import json
+import os
+from functools import wraps
+from flask import Response, current_app, jsonify, request, stream_with_context, url_for
+from flask.json.provider import DefaultJSONProvider
+from cache import catalog_cache, catalog_key
+from compression import cached_compressed_response
+from database import primary_after_writes
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", 50))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 200))
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 1000))
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", 1000))
+CACHE_CONTROL = os.getenv("CACHE_CONTROL", "public, no-cache")
+# auto picks orjson, then msgspec, then the standard library
+JSON_ENCODER = os.getenv("JSON_ENCODER", "auto")
+
+def load_json_encoder(name):
+    if name in ("auto", "orjson"):
+        try:
+            import orjson
+            return "orjson", lambda value: orjson.dumps(value, default=DefaultJSONProvider.default)
+        except ImportError:
+            if name == "orjson":
+                raise
+    if name in ("auto", "msgspec"):
+        try:
+            import msgspec
+            encoder = msgspec.json.Encoder(enc_hook=DefaultJSONProvider.default)
+            return "msgspec", encoder.encode
+        except ImportError:
+            if name == "msgspec":
+                raise
+    return "json", lambda value: json.dumps(value, separators=(",", ":"), default=DefaultJSONProvider.default).encode()
+
+json_encoder_name, encode_json = load_json_encoder(JSON_ENCODER)
+
+class FastJSONProvider(DefaultJSONProvider):
+    # Used by jsonify, encodes straight to bytes with the selected encoder
+    def dumps(self, obj, **kwargs):
+        return encode_json(obj).decode()
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(encode_json(obj), mimetype=self.mimetype)
 
 class APIException(Exception):
     status_code = 400
@@ -15,6 +60,137 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(cursor + padding).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise APIException("Invalid cursor", status_code=400)
+
+def parse_limit(value):
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise APIException("Invalid limit", status_code=400)
+    if limit < 1:
+        raise APIException("Invalid limit", status_code=400)
+    return min(limit, MAX_PAGE_SIZE)
+
+def selected_fields(model, args):
+    # ?fields=id,name narrows the SELECT itself, id is always included
+    fields = args.get("fields")
+    if not fields:
+        return model.serialize_columns
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in model.serialize_columns]
+    if unknown:
+        raise APIException("Unknown fields: " + ", ".join(unknown), status_code=400)
+    return tuple(name for name in model.serialize_columns if name == "id" or name in requested)
+
+def serialize_columns(model, fields=None):
+    return [getattr(model, name) for name in fields or model.serialize_columns]
+
+def serialize_row(model, row, fields=None):
+    return dict(zip(fields or model.serialize_columns, row))
+
+def paginate(model, args, *criteria):
+    # Keyset pagination ordered by primary key: ?limit=&after=<cursor>.
+    # Only the serialized columns are selected, rows are plain tuples
+    limit = parse_limit(args.get("limit"))
+    fields = selected_fields(model, args)
+    query = model.query.with_entities(*serialize_columns(model, fields)).filter(*criteria).order_by(model.id)
+    after = args.get("after")
+    if after:
+        query = query.filter(model.id > decode_cursor(after))
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].id)
+    return rows, next_cursor
+
+def serialize_page(model, args, *criteria):
+    rows, next_cursor = paginate(model, args, *criteria)
+    if rows == []:
+        return None
+    fields = selected_fields(model, args)
+    return {
+        "msg": "ok",
+        "results": [serialize_row(model, row, fields) for row in rows],
+        "next": next_cursor
+    }
+
+def wants_stream(request):
+    if request.args.get("stream") == "1":
+        return True
+    return request.accept_mimetypes.best == "application/x-ndjson"
+
+def stream_ndjson(model, args):
+    # Emit one JSON object per line while reading rows in batches,
+    # so memory stays flat regardless of the table size
+    fields = selected_fields(model, args)
+    def generate():
+        query = model.query.with_entities(*serialize_columns(model, fields)).order_by(model.id).yield_per(STREAM_BATCH_SIZE)
+        for row in query:
+            yield encode_json(serialize_row(model, row, fields)) + b"\n"
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+def parse_bulk_body(request):
+    # Bulk endpoints take a JSON array or one JSON document per line (NDJSON)
+    try:
+        if request.mimetype == "application/x-ndjson":
+            text = request.get_data(as_text=True)
+            return [json.loads(line) for line in text.splitlines() if line.strip()]
+        body = json.loads(request.get_data(as_text=True))
+    except ValueError:
+        raise APIException("Invalid JSON body", status_code=400)
+    if isinstance(body, dict) and "ids" in body:
+        body = body["ids"]
+    if not isinstance(body, list):
+        raise APIException("Expected a JSON array", status_code=400)
+    return body
+
+def chunks(items, size=None):
+    size = size or BULK_BATCH_SIZE
+    for start in range(0, len(items), size):
+        yield start, items[start:start + size]
+
+def table_etag(model):
+    from models import table_version
+    etag = catalog_cache.get_or_set(catalog_key(model, "version"), lambda: table_version(model))
+    if wants_stream(request):
+        etag += "-ndjson"
+    return etag
+
+def conditional_get(model):
+    # Answers 304 when If-None-Match matches the table version, otherwise
+    # runs the view and tags successful responses with ETag and Cache-Control.
+    # ETags are weak since the same version is served in several encodings
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            primary_after_writes(model.__tablename__)
+            etag = table_etag(model)
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                response = cached_compressed_response(etag)
+                if response is None:
+                    response = current_app.make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+            response.set_etag(etag, weak=True)
+            response.headers["Cache-Control"] = CACHE_CONTROL
+            response.vary.add("Accept")
+            return response
+        return wrapper
+    return decorator
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
@@ -25,7 +201,7 @@ def generate_sitemap(app):
     for rule in app.url_map.iter_rules():
         # Filter out rules we can't navigate to in a browser
         # and rules that require parameters
-        if "GET" in rule.methods and has_no_empty_params(rule):
+        if "GET" in rule.methods and has_no_empty_params(rule) and not getattr(app.view_functions[rule.endpoint], "internal", False):
             url = url_for(rule.endpoint, **(rule.defaults or {}))
             if "/admin/" not in url:
                 links.append(url)
@@ -0,0 +1,81 @@
+import os
+import sys
+import tempfile
+import pytest
+from collections import Counter
+from flask import g, request, request_finished
+
+# The app reads its configuration at import time
+DATABASE_PATH = os.path.join(tempfile.mkdtemp(), "test.db")
+os.environ["DATABASE_URL"] = "sqlite:///" + DATABASE_PATH
+os.environ["CACHE_URL"] = "memory://"
+os.environ["RATE_LIMIT_ENABLED"] = "0"
+os.environ["CHANGES_SETTLE_SECONDS"] = "0"
+os.environ["SCRYPT_N"] = "1024"
+os.environ["QUERY_DEBUG"] = "raise"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from app import app as flask_app
+from cache import catalog_cache, compressed_cache, favorites_cache, identity_cache, shared_cache
+from models import db
+
+MIGRATIONS_DIRECTORY = os.path.join(os.path.dirname(__file__), "..", "migrations")
+
+def reset_caches():
+    for cache in (catalog_cache, compressed_cache, favorites_cache, identity_cache):
+        cache.clear()
+    shared_cache.data.clear()
+
+def remove_database():
+    with flask_app.app_context():
+        db.engine.dispose()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(DATABASE_PATH + suffix):
+            os.remove(DATABASE_PATH + suffix)
+
+@pytest.fixture
+def app():
+    flask_app.config["TESTING"] = True
+    remove_database()
+    with flask_app.app_context():
+        db.create_all()
+    reset_caches()
+    yield flask_app
+    remove_database()
+
+@pytest.fixture
+def empty_database():
+    # For tests that build the schema themselves (migrations)
+    remove_database()
+    reset_caches()
+    yield flask_app
+    remove_database()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def auth_headers(client):
+    response = client.post("/signup", json={"email": "luke@example.com", "password": "x-wing"})
+    return {"Authorization": "Bearer " + response.get_json()["access_token"]}
+
+@pytest.fixture
+def migrated_app(empty_database):
+    # The schema built by the migrations, with the indexes create_all lacks
+    from flask_migrate import upgrade
+    empty_database.config["TESTING"] = True
+    with empty_database.app_context():
+        upgrade(directory=MIGRATIONS_DIRECTORY)
+        db.session.remove()
+    yield empty_database
+
+@pytest.fixture
+def sql_log(app):
+    # SQL statements of every request the test makes, as counted by metrics.py
+    log = []
+    def record(sender, response, **extra):
+        log.append({"request": "%s %s" % (request.method, request.path), "count": g.sql_count, "shapes": Counter(g.sql_shapes)})
+    request_finished.connect(record, app)
+    yield log
+    request_finished.disconnect(record, app)
@@ -0,0 +1,60 @@
+import asyncio
+import gzip
+import json
+import asgi
+import database
+
+def asgi_get(path, query_string=b"", headers=()):
+    messages = []
+    scope = {"type": "http", "method": "GET", "path": path, "query_string": query_string, "headers": list(headers)}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    async def call():
+        await asgi.application(scope, receive, send)
+        await asgi.engine.dispose()
+
+    asyncio.run(call())
+    start, body = messages[0], b"".join(message.get("body", b"") for message in messages[1:])
+    return start["status"], dict(start["headers"]), body
+
+def test_async_reads_share_the_sync_etag(client):
+    client.post("/people", json={"name": "Luke", "description": None})
+    etag = client.get("/people").headers["ETag"]
+    status, headers, body = asgi_get("/people")
+    assert status == 200
+    assert headers[b"etag"].decode() == etag
+    assert json.loads(body)["results"][0]["name"] == "Luke"
+    assert asgi_get("/people", headers=[(b"if-none-match", etag.encode())])[0] == 304
+
+def test_async_reads_are_compressed(client):
+    client.post("/people/bulk", json=[{"name": "Trooper %d" % index, "description": "Stormtrooper"} for index in range(40)])
+    status, headers, body = asgi_get("/people", headers=[(b"accept-encoding", b"gzip")])
+    assert status == 200
+    assert headers[b"content-encoding"] == b"gzip"
+    assert len(json.loads(gzip.decompress(body))["results"]) == 40
+    # The Flask route serves the body the async path cached
+    response = client.get("/people", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.data == body
+    status, headers, body = asgi_get("/people")
+    assert b"content-encoding" not in headers
+    assert len(json.loads(body)["results"]) == 40
+
+def test_async_engine_gets_the_connection_settings(client):
+    async def pragmas():
+        async with asgi.engine.connect() as conn:
+            values = [(await conn.exec_driver_sql("PRAGMA %s" % name)).scalar() for name in ("busy_timeout", "journal_mode", "foreign_keys")]
+        await asgi.engine.dispose()
+        return values
+    assert asyncio.run(pragmas()) == [database.SQLITE_BUSY_TIMEOUT_MS, "wal", 1]
+
+def test_statement_timeout_for_each_async_driver(monkeypatch):
+    monkeypatch.setattr(database, "DB_STATEMENT_TIMEOUT_MS", 2000)
+    postgres = database.async_engine_options("postgresql://user@db/starwars")
+    assert postgres["connect_args"] == {"server_settings": {"statement_timeout": "2000"}}
+    assert database.engine_options("postgresql://user@db/starwars")["connect_args"] == {"options": "-c statement_timeout=2000"}
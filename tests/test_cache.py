@@ -0,0 +1,98 @@
+import threading
+import fakeredis
+import pytest
+import cache
+from cache import FileBackend, MemoryBackend, RedisBackend
+
+def cache_model(table):
+    return type("Model", (), {"__tablename__": table})
+
+def redis_backend(tmp_path):
+    return RedisBackend("redis://fake", client=fakeredis.FakeRedis())
+
+BACKENDS = [
+    lambda tmp_path: MemoryBackend(),
+    lambda tmp_path: FileBackend(str(tmp_path)),
+    redis_backend,
+]
+
+@pytest.mark.parametrize("make_backend", BACKENDS)
+def test_get_many_set_and_incr(make_backend, tmp_path):
+    backend = make_backend(tmp_path)
+    backend.set("a", {"x": 1})
+    assert backend.get_many(["a", "missing"]) == [{"x": 1}, None]
+    assert [backend.incr("counter") for _ in range(3)] == [1, 2, 3]
+    assert backend.get("counter") == 3
+    backend.delete("a")
+    assert backend.get("a") is None
+
+@pytest.mark.parametrize("make_backend", BACKENDS[:2])
+def test_expired_values_are_not_returned(make_backend, tmp_path, monkeypatch):
+    backend = make_backend(tmp_path)
+    backend.set("short", 1, ttl=1)
+    now = cache.time.time()
+    monkeypatch.setattr(cache.time, "time", lambda: now + 2)
+    assert backend.get("short") is None
+
+def test_redis_values_expire_with_their_ttl():
+    client = fakeredis.FakeRedis()
+    RedisBackend("redis://fake", client=client).set("short", 1, ttl=3)
+    assert client.ttl("short") == 3
+
+@pytest.mark.parametrize("make_backend", BACKENDS)
+def test_token_bucket(make_backend, tmp_path, monkeypatch):
+    backend = make_backend(tmp_path)
+    now = 1000.0
+    monkeypatch.setattr(cache.time, "time", lambda: now)
+    assert [backend.take_token("bucket", 1, 3) for _ in range(3)] == [0, 0, 0]
+    assert backend.take_token("bucket", 1, 3) == pytest.approx(1)
+    now += 2
+    assert backend.take_token("bucket", 1, 3) == 0
+    assert backend.take_token("bucket", 1, 3) == 0
+    assert backend.take_token("bucket", 1, 3) > 0
+
+def test_redis_token_bucket_expires_its_key():
+    client = fakeredis.FakeRedis()
+    RedisBackend("redis://fake", client=client).take_token("bucket", 2, 10)
+    assert client.ttl("bucket") == 5
+
+def test_two_instances_share_the_generation_counter(tmp_path, monkeypatch):
+    # Two workers of one host point at the same directory
+    first, second = FileBackend(str(tmp_path)), FileBackend(str(tmp_path))
+    monkeypatch.setattr(cache, "shared_cache", first)
+    before = cache.catalog_key(cache_model("character"))
+    monkeypatch.setattr(cache, "shared_cache", second)
+    cache.invalidate_catalog(cache_model("character"))
+    monkeypatch.setattr(cache, "shared_cache", first)
+    assert cache.catalog_key(cache_model("character")) != before
+    assert cache.recently_written("character")
+
+def test_redis_instances_share_the_generation_counter(monkeypatch):
+    server = fakeredis.FakeServer()
+    first = RedisBackend("redis://fake", client=fakeredis.FakeRedis(server=server))
+    second = RedisBackend("redis://fake", client=fakeredis.FakeRedis(server=server))
+    monkeypatch.setattr(cache, "shared_cache", first)
+    before = cache.favorites_key(1)
+    monkeypatch.setattr(cache, "shared_cache", second)
+    cache.invalidate_favorites()
+    monkeypatch.setattr(cache, "shared_cache", first)
+    assert cache.favorites_key(1) != before
+
+def test_concurrent_file_writes(tmp_path):
+    first, second = FileBackend(str(tmp_path)), FileBackend(str(tmp_path))
+    errors = []
+    def write(backend):
+        try:
+            for index in range(500):
+                backend.set("written", index, ttl=5)
+                backend.incr("generation")
+        except Exception as error:
+            errors.append(error)
+    threads = [threading.Thread(target=write, args=(backend,)) for backend in (first, second, first, second)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert first.get("generation") == second.get("generation") == 2000
+    assert not [name for name in tmp_path.iterdir() if name.suffix == ".tmp"]
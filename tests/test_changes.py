@@ -0,0 +1,61 @@
+from flask_migrate import upgrade
+from conftest import MIGRATIONS_DIRECTORY
+from models import db, reconcile_favorite_counts
+
+def test_first_sync_after_migration_returns_existing_rows(empty_database):
+    with empty_database.app_context():
+        upgrade(directory=MIGRATIONS_DIRECTORY, revision="f81d3c6a0b95")
+        db.session.execute(db.text("INSERT INTO user (id, email, password) VALUES (1, 'luke@example.com', 'x')"))
+        db.session.execute(db.text("INSERT INTO character (id, name, description) VALUES (1, 'Luke', NULL), (2, 'Leia', NULL)"))
+        db.session.execute(db.text("INSERT INTO planet (id, name, description) VALUES (1, 'Tatooine', NULL)"))
+        db.session.execute(db.text("INSERT INTO favorite (id, user_id, kind, entity_id) VALUES (1, 1, 'character', 2)"))
+        db.session.commit()
+        upgrade(directory=MIGRATIONS_DIRECTORY)
+        db.session.remove()
+
+    client = empty_database.test_client()
+    with empty_database.app_context():
+        from flask_jwt_extended import create_access_token
+        token = create_access_token(identity="luke@example.com", additional_claims={"user_id": 1})
+    body = client.get("/changes", headers={"Authorization": "Bearer " + token}).get_json()
+    assert [row["id"] for row in body["changes"]["people"]] == [1, 2]
+    assert [row["id"] for row in body["changes"]["planets"]] == [1]
+    assert [(row["kind"], row["entity_id"]) for row in body["changes"]["favorites"]] == [("character", 2)]
+
+    # Nothing is returned twice
+    again = client.get("/changes?since=" + body["next"], headers={"Authorization": "Bearer " + token}).get_json()
+    assert all(rows == [] for rows in again["changes"].values())
+
+def test_changes_pages_through_creates_and_deletes(client, auth_headers):
+    for name in ("Luke", "Leia", "Han"):
+        client.post("/people", json={"name": name, "description": None})
+    client.post("/favorite/people/2", headers=auth_headers)
+
+    first = client.get("/changes?limit=2", headers=auth_headers).get_json()
+    assert [row["name"] for row in first["changes"]["people"]] == ["Luke", "Leia"]
+    assert first["more"] is True
+    second = client.get("/changes?limit=2&since=" + first["next"], headers=auth_headers).get_json()
+    assert [row["name"] for row in second["changes"]["people"]] == ["Han"]
+    assert second["more"] is False
+
+    client.delete("/people/3")
+    client.delete("/favorite/people/2", headers=auth_headers)
+    third = client.get("/changes?since=" + second["next"], headers=auth_headers).get_json()
+    assert third["changes"]["people"] == []
+    assert [(row["table"], row["id"]) for row in third["changes"]["deleted"]] == [("character", 3)]
+    assert [row["table"] for row in third["changes"]["deleted_favorites"]] == ["favorite"]
+
+def test_invalid_token_is_rejected(client):
+    assert client.get("/changes?since=not-a-token").status_code == 400
+
+def test_reconciled_counts_are_not_changes(app, client, auth_headers):
+    client.post("/people", json={"name": "Luke", "description": None})
+    first = client.get("/changes", headers=auth_headers).get_json()
+    etag = client.get("/people").headers["ETag"]
+    with app.app_context():
+        db.session.execute(db.text("UPDATE character SET favorites_count = 5"))
+        db.session.commit()
+        assert reconcile_favorite_counts()["character"] == 1
+    again = client.get("/changes?since=" + first["next"], headers=auth_headers).get_json()
+    assert again["changes"]["people"] == []
+    assert client.get("/people", headers={"If-None-Match": etag}).status_code == 304
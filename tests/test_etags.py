@@ -0,0 +1,42 @@
+from cache import generation_key, shared_cache
+from models import db, Character, table_version
+
+def test_etag_changes_when_a_deleted_id_is_reused(client):
+    client.post("/people", json={"name": "Luke", "description": None})
+    first = client.get("/people").headers["ETag"]
+    client.delete("/people/1")
+    client.post("/people", json={"name": "Luke", "description": None})
+    response = client.get("/people", headers={"If-None-Match": first})
+    # SQLite handed out id 1 again, count(*) and max(id) are unchanged
+    assert client.get("/people/1").get_json()["name"] == "Luke"
+    assert response.status_code == 200
+    assert response.headers["ETag"] != first
+
+def test_admin_edit_changes_the_version(app, client):
+    client.post("/people", json={"name": "Luke", "description": None})
+    first = client.get("/people").headers["ETag"]
+    with app.app_context():
+        before = table_version(Character)
+        character = db.session.get(Character, 1)
+        character.description = "Jedi"
+        db.session.commit()
+        assert table_version(Character) != before
+    response = client.get("/people", headers={"If-None-Match": first})
+    assert response.status_code == 200
+    assert response.get_json()["results"][0]["description"] == "Jedi"
+
+def test_unchanged_table_answers_not_modified(client):
+    client.post("/people", json={"name": "Luke", "description": None})
+    etag = client.get("/people").headers["ETag"]
+    assert client.get("/people", headers={"If-None-Match": etag}).status_code == 304
+
+def test_single_writes_bump_the_generation_once(client):
+    def generation():
+        return shared_cache.get(generation_key("character")) or 0
+    before = generation()
+    client.post("/people", json={"name": "Luke", "description": None})
+    assert generation() == before + 1
+    client.delete("/people/1")
+    assert generation() == before + 2
+    client.post("/people/bulk", json=[{"name": "Leia"}, {"name": "Han"}])
+    assert generation() == before + 3
@@ -0,0 +1,42 @@
+from models import db, Character
+
+def counts(client):
+    return {row["name"]: row["favorites_count"] for row in client.get("/leaderboard/people").get_json()["results"]}
+
+def test_count_follows_adds_and_removes(client, auth_headers):
+    for name in ("Luke", "Leia"):
+        client.post("/people", json={"name": name, "description": None})
+    assert client.post("/favorite/people/1", headers=auth_headers).status_code == 201
+    assert counts(client) == {"Luke": 1, "Leia": 0}
+    # A duplicate is refused and not counted
+    assert client.post("/favorite/people/1", headers=auth_headers).status_code == 400
+    assert counts(client) == {"Luke": 1, "Leia": 0}
+    other = client.post("/signup", json={"email": "leia@example.com", "password": "alderaan"}).get_json()["access_token"]
+    client.post("/favorite/people/1", headers={"Authorization": "Bearer " + other})
+    client.post("/favorite/people/2", headers={"Authorization": "Bearer " + other})
+    assert counts(client) == {"Luke": 2, "Leia": 1}
+    assert client.delete("/favorite/people/1", headers=auth_headers).status_code == 200
+    # Removing a favorite that is not there leaves the count alone
+    assert client.delete("/favorite/people/1", headers=auth_headers).status_code == 400
+    assert counts(client) == {"Luke": 1, "Leia": 1}
+
+def test_leaderboard_orders_by_count(client, auth_headers):
+    for name in ("Luke", "Leia", "Han"):
+        client.post("/people", json={"name": name, "description": None})
+    client.post("/favorite/people/2", headers=auth_headers)
+    names = [row["name"] for row in client.get("/leaderboard/people?limit=2").get_json()["results"]]
+    assert names == ["Leia", "Han"]
+
+def test_reconcile_command_repairs_drift(app, client, auth_headers):
+    for name in ("Luke", "Leia"):
+        client.post("/people", json={"name": name, "description": None})
+    client.post("/favorite/people/1", headers=auth_headers)
+    with app.app_context():
+        db.session.execute(db.update(Character).values(favorites_count=7))
+        db.session.commit()
+    assert counts(client) == {"Luke": 7, "Leia": 7}
+    result = app.test_cli_runner().invoke(args=["reconcile-favorites"])
+    assert "2 character" in result.output
+    assert counts(client) == {"Luke": 1, "Leia": 0}
+    # Nothing left to repair
+    assert "0 character" in app.test_cli_runner().invoke(args=["reconcile-favorites"]).output
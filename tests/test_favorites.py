@@ -0,0 +1,41 @@
+from models import db, Favorite, FavoriteCharacter
+
+def unified_favorites(app):
+    with app.app_context():
+        return db.session.execute(db.select(Favorite.kind, Favorite.entity_id).order_by(Favorite.id)).all()
+
+def test_deleting_an_entity_removes_its_unified_favorites(app, client, auth_headers):
+    client.post("/people", json={"name": "Luke", "description": None})
+    client.post("/planets", json={"name": "Tatooine", "description": None})
+    client.post("/favorite/people/1", headers=auth_headers)
+    client.post("/favorite/planet/1", headers=auth_headers)
+    since = client.get("/changes", headers=auth_headers).get_json()["next"]
+
+    assert client.delete("/people/1").status_code == 200
+    assert unified_favorites(app) == [("planet", 1)]
+    changes = client.get("/changes?since=" + since, headers=auth_headers).get_json()["changes"]
+    assert [row["table"] for row in changes["deleted_favorites"]] == ["favorite"]
+    # A new character reusing the id does not inherit the favorite
+    client.post("/people", json={"name": "Leia", "description": None})
+    assert unified_favorites(app) == [("planet", 1)]
+
+def test_favorite_already_backfilled_is_created(app, client, auth_headers):
+    client.post("/people", json={"name": "Luke", "description": None})
+    with app.app_context():
+        # The backfill copied the row before the per-kind insert committed
+        db.session.add(Favorite(user_id=1, kind="character", entity_id=1))
+        db.session.commit()
+    assert client.post("/favorite/people/1", headers=auth_headers).status_code == 201
+    assert unified_favorites(app) == [("character", 1)]
+    with app.app_context():
+        assert db.session.execute(db.select(db.func.count(FavoriteCharacter.id))).scalar() == 1
+
+def test_bulk_delete_keeps_only_the_favorited_ids(app, client, auth_headers):
+    client.post("/people/bulk", json=[{"name": name} for name in ("Luke", "Leia", "Han")])
+    client.post("/favorite/people/2", headers=auth_headers)
+    response = client.delete("/people/bulk", json=[1, 2, 3, True, "4", 99])
+    assert [result["status"] for result in response.get_json()["results"]] == [
+        "deleted", "conflict", "deleted", "invalid", "invalid", "not found"
+    ]
+    assert [row["name"] for row in client.get("/people").get_json()["results"]] == ["Leia"]
+    assert unified_favorites(app) == [("character", 2)]
@@ -0,0 +1,23 @@
+def character_selects(sql_log):
+    return [statement for entry in sql_log for statement in entry["shapes"] if statement.startswith("SELECT") and "FROM character" in statement]
+
+def test_fields_narrow_the_select_and_the_body(client, sql_log):
+    client.post("/people", json={"name": "Luke", "description": "Farm boy"})
+    del sql_log[:]
+    page = client.get("/people?fields=id,name").get_json()
+    one = client.get("/people/1?fields=name").get_json()
+    assert page["results"] == [{"id": 1, "name": "Luke"}]
+    assert one == {"id": 1, "name": "Luke"}
+    selects = character_selects(sql_log)
+    assert selects
+    assert not [statement for statement in selects if "description" in statement]
+
+def test_all_fields_by_default(client):
+    client.post("/people", json={"name": "Luke", "description": "Farm boy"})
+    assert client.get("/people/1").get_json()["description"] == "Farm boy"
+
+def test_unknown_fields_are_rejected(client):
+    client.post("/people", json={"name": "Luke", "description": "Farm boy"})
+    response = client.get("/people?fields=name,password")
+    assert response.status_code == 400
+    assert "password" in response.get_json()["message"]
@@ -0,0 +1,43 @@
+import metrics
+
+TOKEN = {"Authorization": "Bearer secret"}
+
+def metric_names(body):
+    # Family of every line, in order, TYPE lines included
+    names = []
+    for line in body.splitlines():
+        name = line.split()[2] if line.startswith("# TYPE") else line.split("{")[0].split()[0]
+        for suffix in ("_bucket", "_sum", "_count"):
+            if name.endswith(suffix) and name[:-len(suffix)] in names:
+                name = name[:-len(suffix)]
+        names.append(name)
+    return names
+
+def test_internal_endpoints_need_the_token(client, monkeypatch):
+    for path in ("/metrics", "/cache/stats", "/db/stats"):
+        assert client.get(path).status_code == 404
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "secret")
+    for path in ("/metrics", "/cache/stats", "/db/stats"):
+        assert client.get(path).status_code == 401
+        assert client.get(path, headers={"Authorization": "Bearer wrong"}).status_code == 401
+        assert client.get(path, headers=TOKEN).status_code == 200
+
+def test_sitemap_leaves_out_internal_endpoints(client):
+    sitemap = client.get("/").get_data(as_text=True)
+    assert "/people" in sitemap
+    for path in ("/metrics", "/cache/stats", "/db/stats"):
+        assert "'%s'" % path not in sitemap
+
+def test_every_family_is_typed_and_contiguous(client, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "secret")
+    client.post("/people", json={"name": "Luke", "description": None})
+    client.get("/people")
+    client.get("/planets")
+    names = metric_names(client.get("/metrics", headers=TOKEN).get_data(as_text=True))
+    families = [name for index, name in enumerate(names) if index == 0 or names[index - 1] != name]
+    # A family shows up once, starting with its TYPE line
+    assert len(families) == len(set(families))
+    body = client.get("/metrics", headers=TOKEN).get_data(as_text=True)
+    typed = {line.split()[2] for line in body.splitlines() if line.startswith("# TYPE")}
+    assert set(families) == typed
+    assert {"sql_statements_total", "sql_seconds_total", "cache_hits_total", "cache_size", "db_pool_checkouts_total"} <= typed
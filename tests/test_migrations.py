@@ -0,0 +1,32 @@
+from flask_migrate import check, downgrade, upgrade
+from conftest import MIGRATIONS_DIRECTORY
+from models import db
+
+def test_password_migration_runs_with_favorites(empty_database):
+    with empty_database.app_context():
+        upgrade(directory=MIGRATIONS_DIRECTORY, revision="9d41c7e2b853")
+        db.session.execute(db.text("INSERT INTO user (id, email, password) VALUES (1, 'luke@example.com', 'x-wing')"))
+        db.session.execute(db.text("INSERT INTO character (id, name) VALUES (1, 'Leia')"))
+        db.session.execute(db.text("INSERT INTO favorite_character (user_id, character_id) VALUES (1, 1)"))
+        db.session.commit()
+        upgrade(directory=MIGRATIONS_DIRECTORY)
+        password = db.session.execute(db.text("SELECT password FROM user")).scalar()
+        tables = db.session.execute(db.text("SELECT name FROM sqlite_master WHERE name LIKE '_alembic_tmp%'")).all()
+        db.session.remove()
+    assert password.startswith("scrypt$")
+    assert tables == []
+
+def test_migrations_downgrade_and_upgrade_again(empty_database):
+    with empty_database.app_context():
+        upgrade(directory=MIGRATIONS_DIRECTORY)
+        db.session.execute(db.text("INSERT INTO user (email, password) VALUES ('luke@example.com', 'x-wing')"))
+        db.session.commit()
+        downgrade(directory=MIGRATIONS_DIRECTORY, revision="9d41c7e2b853")
+        upgrade(directory=MIGRATIONS_DIRECTORY)
+        db.session.remove()
+
+def test_models_match_the_migrations(migrated_app):
+    # Autogenerate must find nothing to do: no FTS tables to drop, no
+    # indexes missing from the models
+    with migrated_app.app_context():
+        check(directory=MIGRATIONS_DIRECTORY)
@@ -0,0 +1,34 @@
+import utils
+
+def create_people(client, count):
+    client.post("/people/bulk", json=[{"name": "Trooper %d" % index, "description": None} for index in range(count)])
+
+def test_next_pages_through_to_the_end(client):
+    create_people(client, 7)
+    names, sizes = [], []
+    url = "/people?limit=3"
+    while url:
+        body = client.get(url).get_json()
+        names += [row["name"] for row in body["results"]]
+        sizes.append(len(body["results"]))
+        url = "/people?limit=3&after=" + body["next"] if body["next"] else None
+    assert sizes == [3, 3, 1]
+    assert names == ["Trooper %d" % index for index in range(7)]
+
+def test_limit_is_capped_at_the_max_page_size(client, monkeypatch):
+    monkeypatch.setattr(utils, "MAX_PAGE_SIZE", 4)
+    create_people(client, 6)
+    body = client.get("/people?limit=1000").get_json()
+    assert len(body["results"]) == 4
+    assert body["next"] is not None
+    rest = client.get("/people?limit=1000&after=" + body["next"]).get_json()
+    assert [row["name"] for row in rest["results"]] == ["Trooper 4", "Trooper 5"]
+    assert rest["next"] is None
+
+def test_invalid_limit_and_cursor(client):
+    create_people(client, 1)
+    assert client.get("/people?limit=0").status_code == 400
+    assert client.get("/people?limit=many").status_code == 400
+    assert client.get("/people?after=!").status_code == 400
+    # Past the last row
+    assert client.get("/people?after=" + utils.encode_cursor(1)).status_code == 404
@@ -0,0 +1,25 @@
+import passwords
+from models import db, User
+
+def stored_password(app):
+    with app.app_context():
+        return db.session.execute(db.select(User.password)).scalar()
+
+def test_login_rehashes_with_the_new_cost(app, client, monkeypatch):
+    credentials = {"email": "luke@example.com", "password": "x-wing"}
+    client.post("/signup", json=credentials)
+    assert stored_password(app).startswith("scrypt$%d$" % passwords.SCRYPT_N)
+    monkeypatch.setattr(passwords, "SCRYPT_N", passwords.SCRYPT_N * 2)
+    assert client.post("/login", json=credentials).status_code == 200
+    assert stored_password(app).startswith("scrypt$%d$" % passwords.SCRYPT_N)
+    # The new hash still verifies, and is left alone
+    before = stored_password(app)
+    assert client.post("/login", json=credentials).status_code == 200
+    assert stored_password(app) == before
+
+def test_wrong_password_keeps_the_old_hash(app, client, monkeypatch):
+    client.post("/signup", json={"email": "luke@example.com", "password": "x-wing"})
+    before = stored_password(app)
+    monkeypatch.setattr(passwords, "SCRYPT_N", passwords.SCRYPT_N * 2)
+    assert client.post("/login", json={"email": "luke@example.com", "password": "tie"}).status_code == 401
+    assert stored_password(app) == before
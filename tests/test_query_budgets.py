@@ -0,0 +1,64 @@
+import pytest
+from metrics import QUERY_REPEAT_LIMIT
+
+@pytest.fixture
+def catalog(client, auth_headers):
+    for route in ("people", "planets", "vehicles"):
+        client.post("/%s/bulk" % route, json=[{"name": "%s %d" % (route, index), "description": "Seeded"} for index in range(30)])
+    for index in range(1, 11):
+        client.post("/favorite/people/%d" % index, headers=auth_headers)
+        client.post("/favorite/planet/%d" % index, headers=auth_headers)
+        client.post("/favorite/vehicle/%d" % index, headers=auth_headers)
+    return auth_headers
+
+# method, path, authenticated, statements allowed. Budgets count what a
+# cold request runs, cache hits only go down from here
+BUDGETS = [
+    ("GET", "/people", False, 2),
+    ("GET", "/people?limit=5&after=NQ", False, 2),
+    ("GET", "/people?name_prefix=peo", False, 2),
+    ("GET", "/people?q=people", False, 2),
+    ("GET", "/people/3", False, 2),
+    ("GET", "/planets", False, 2),
+    ("GET", "/vehicles/3", False, 2),
+    ("GET", "/search?q=seeded", False, 3),
+    ("GET", "/leaderboard/people", False, 1),
+    ("GET", "/users", False, 1),
+    ("GET", "/users/1", False, 1),
+    ("GET", "/users/favorites?expand=1", True, 1),
+    ("GET", "/changes", True, 6),
+    ("POST", "/people", False, 3),
+    ("DELETE", "/people/30", False, 6),
+    ("POST", "/favorite/people/20", True, 3),
+    ("DELETE", "/favorite/people/1", True, 5),
+    ("POST", "/favorite/planet/20", True, 3),
+    ("DELETE", "/favorite/vehicle/1", True, 5),
+    ("POST", "/login", False, 1),
+]
+
+@pytest.mark.parametrize("method, path, authenticated, budget", BUDGETS)
+def test_endpoint_query_budget(client, catalog, sql_log, method, path, authenticated, budget):
+    del sql_log[:]
+    body = None
+    if method == "POST" and path == "/people":
+        body = {"name": "Yoda", "description": None}
+    elif path == "/login":
+        body = {"email": "luke@example.com", "password": "x-wing"}
+    response = client.open(path, method=method, json=body, headers=catalog if authenticated else None)
+    assert response.status_code < 400
+    [entry] = sql_log
+    assert entry["count"] <= budget
+    assert max(entry["shapes"].values(), default=0) < QUERY_REPEAT_LIMIT
+
+@pytest.mark.parametrize("route", ["people", "planets", "vehicles"])
+def test_bulk_statements_do_not_grow_with_the_batch(client, sql_log, route):
+    # Bulk routes are exempt from the budget, but must not run per-item queries
+    created, deleted = [], []
+    for start, size in ((1, 5), (6, 50)):
+        del sql_log[:]
+        client.post("/%s/bulk" % route, json=[{"name": "%s %d" % (route, index)} for index in range(start, start + size)])
+        client.delete("/%s/bulk" % route, json=list(range(start, start + size)))
+        created.append(sql_log[0]["count"])
+        deleted.append(sql_log[1]["count"])
+    assert created[0] == created[1]
+    assert deleted[0] == deleted[1]
@@ -0,0 +1,75 @@
+import re
+from sqlalchemy import event
+from models import db
+
+# Plan lines that read a whole table. A rowid-ordered scan is fine when
+# nothing is filtered and the statement stops at a LIMIT (the first page
+# of a keyset list)
+FULL_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)(\w+)\b(?! USING| VIRTUAL TABLE)")
+
+ROUTES = [
+    # catalog route, favorite route
+    ("people", "people"),
+    ("planets", "planet"),
+    ("vehicles", "vehicle"),
+]
+
+def hot_requests(client, headers):
+    client.post("/login", json={"email": "luke@example.com", "password": "x-wing"})
+    client.get("/users/1")
+    for route, favorite_route in ROUTES:
+        client.post("/%s" % route, json={"name": "Tatooine", "description": "Desert"})
+        client.post("/%s" % route, json={"name": "Hoth", "description": "Ice"})
+        client.post("/%s/bulk" % route, json=[{"name": "Naboo"}, {"name": "Endor"}])
+        client.get("/%s" % route)
+        client.get("/%s?limit=1&after=MQ" % route)
+        client.get("/%s?name_prefix=ta" % route)
+        client.get("/%s?q=desert" % route)
+        client.get("/%s/1?fields=name" % route)
+        client.get("/leaderboard/%s" % route)
+        client.post("/favorite/%s/1" % favorite_route, headers=headers)
+        client.post("/favorite/%s/2" % favorite_route, headers=headers)
+        client.delete("/favorite/%s/2" % favorite_route, headers=headers)
+        client.delete("/%s/bulk" % route, json=[3, 4])
+        client.delete("/%s/2" % route)
+    client.get("/users/favorites", headers=headers)
+    client.get("/search?q=ice")
+    client.get("/changes", headers=headers)
+
+def full_scans(connection, statement, parameters):
+    plan = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    scans = []
+    for row in plan:
+        match = FULL_SCAN.match(row[-1])
+        if match is None:
+            continue
+        bounded = not re.search(r"\bWHERE\b", statement) and re.search(r"\bORDER BY \w+\.id\b", statement) and re.search(r"\bLIMIT\b", statement)
+        if not bounded:
+            scans.append(row[-1])
+    return scans
+
+def test_hot_queries_use_indexes(migrated_app):
+    client = migrated_app.test_client()
+    token = client.post("/signup", json={"email": "luke@example.com", "password": "x-wing"}).get_json()["access_token"]
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().split(" ", 1)[0] in ("SELECT", "UPDATE", "DELETE"):
+            statements.append((statement, parameters))
+
+    with migrated_app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        hot_requests(client, {"Authorization": "Bearer " + token})
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    assert len(statements) > 50
+
+    failures = {}
+    with engine.connect() as connection:
+        for statement, parameters in statements:
+            scans = full_scans(connection, statement, parameters)
+            if scans:
+                failures[statement] = scans
+    assert failures == {}
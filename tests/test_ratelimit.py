@@ -0,0 +1,63 @@
+import pytest
+import cache
+import ratelimit
+from cache import FileBackend, MemoryBackend
+
+AUTH_BURST = ratelimit.parse_budget(ratelimit.RATE_LIMITS["auth"])[1]
+
+@pytest.fixture
+def limited(client, monkeypatch):
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_ENABLED", True)
+    return client
+
+def login(client, address, forwarded_for=None):
+    headers = {"X-Forwarded-For": forwarded_for} if forwarded_for else {}
+    return client.post("/login", json={"email": "nobody@example.com", "password": "x"}, headers=headers, environ_base={"REMOTE_ADDR": address})
+
+def test_burst_is_cut_at_the_bucket_size(limited):
+    statuses = [login(limited, "10.0.0.1").status_code for _ in range(AUTH_BURST + 5)]
+    assert statuses[:AUTH_BURST] == [404] * AUTH_BURST
+    assert statuses[AUTH_BURST:] == [429] * 5
+    response = login(limited, "10.0.0.1")
+    assert int(response.headers["Retry-After"]) >= 1
+
+def test_quiet_client_is_served_during_a_burst(limited):
+    # One client hammers the route while another sends a request now and then
+    quiet = []
+    for index in range(AUTH_BURST * 3):
+        login(limited, "10.0.0.1")
+        if index % 6 == 0:
+            quiet.append(login(limited, "10.0.0.2").status_code)
+    assert quiet == [404] * len(quiet)
+    assert login(limited, "10.0.0.1").status_code == 429
+
+def test_forged_forwarded_for_does_not_open_new_buckets(limited):
+    # The proxy appends the real address, earlier entries come from the client
+    statuses = [
+        login(limited, "10.0.0.254", forwarded_for="192.0.2.%d, 203.0.113.7" % index).status_code
+        for index in range(AUTH_BURST + 1)
+    ]
+    assert statuses[-1] == 429
+    assert login(limited, "10.0.0.254", forwarded_for="203.0.113.8").status_code == 404
+
+def test_users_behind_one_address_have_their_own_budget(limited, auth_headers):
+    other = limited.post("/signup", json={"email": "leia@example.com", "password": "alderaan"}).get_json()["access_token"]
+    _, burst = ratelimit.parse_budget(ratelimit.RATE_LIMITS["write"])
+    for index in range(burst):
+        limited.post("/favorite/people/%d" % index, headers=auth_headers)
+    assert limited.post("/favorite/people/1", headers=auth_headers).status_code == 429
+    assert limited.post("/favorite/people/1", headers={"Authorization": "Bearer " + other}).status_code != 429
+
+@pytest.mark.parametrize("make_backend", [lambda tmp_path: MemoryBackend(), lambda tmp_path: FileBackend(str(tmp_path))])
+def test_expired_buckets_are_purged(make_backend, tmp_path, monkeypatch):
+    backend = make_backend(tmp_path)
+    now = cache.time.time()
+    for index in range(20):
+        backend.take_token("bucket:%d" % index, 1, 5)
+    monkeypatch.setattr(cache.time, "time", lambda: now + cache.CACHE_PURGE_INTERVAL + 10)
+    backend.take_token("bucket:fresh", 1, 5)
+    if isinstance(backend, MemoryBackend):
+        assert list(backend.data) == ["bucket:fresh"]
+    else:
+        assert len([name for name in tmp_path.iterdir() if not name.name.startswith(".")]) == 1
+    assert backend.take_token("bucket:0", 1, 5) == 0
@@ -0,0 +1,33 @@
+import os
+import tempfile
+import pytest
+from sqlalchemy import create_engine
+import database
+from cache import shared_cache, written_key
+from models import db
+
+@pytest.fixture
+def lagging_replica(app, monkeypatch):
+    # A replica that never receives the primary's writes
+    path = os.path.join(tempfile.mkdtemp(), "replica.db")
+    engine = create_engine("sqlite:///" + path)
+    db.metadata.create_all(engine)
+    monkeypatch.setattr(database, "REPLICA_BIND_KEYS", ["replica_0"])
+    with app.app_context():
+        monkeypatch.setitem(db.engines, "replica_0", engine)
+    yield engine
+    engine.dispose()
+
+def test_reads_right_after_a_write_fill_the_cache_from_the_primary(client, lagging_replica):
+    client.post("/people", json={"name": "Luke", "description": None})
+    response = client.get("/people")
+    assert response.status_code == 200
+    assert [row["name"] for row in response.get_json()["results"]] == ["Luke"]
+    # The page was cached from the primary and stays right after the window
+    shared_cache.delete(written_key("character"))
+    assert client.get("/people").get_json()["results"][0]["name"] == "Luke"
+
+def test_reads_outside_the_window_use_the_replica(client, lagging_replica):
+    client.post("/planets", json={"name": "Hoth", "description": None})
+    shared_cache.delete(written_key("planet"))
+    assert client.get("/planets/1").status_code == 404
@@ -0,0 +1,35 @@
+def create_people(client, count):
+    for index in range(count):
+        client.post("/people", json={"name": "Yoda %d" % index, "description": "Jedi master"})
+    client.post("/people", json={"name": "Luke", "description": "Farm boy"})
+    client.post("/planets", json={"name": "Dagobah", "description": "Home of Yoda"})
+
+def test_search_pages_through_every_match(client):
+    create_people(client, 5)
+    seen = []
+    url = "/search?q=yoda&limit=2"
+    pages = 0
+    while True:
+        body = client.get(url).get_json()
+        pages += 1
+        seen += [row["name"] for row in body["results"]["people"]]
+        if body["next"]["people"] is None:
+            break
+        url = "/search?q=yoda&limit=2&after=" + body["next"]["people"]
+    assert pages == 3
+    assert sorted(seen) == ["Yoda %d" % index for index in range(5)]
+    # The planet ran out on the first page
+    first = client.get("/search?q=yoda&limit=2").get_json()
+    assert [row["name"] for row in first["results"]["planets"]] == ["Dagobah"]
+    assert first["next"]["planets"] is None
+
+def test_search_selects_the_requested_fields(client):
+    create_people(client, 1)
+    body = client.get("/search?q=yoda&fields=name").get_json()
+    assert body["results"]["people"] == [{"id": 1, "name": "Yoda 0"}]
+
+def test_search_without_matches_or_query(client):
+    create_people(client, 1)
+    assert client.get("/search?q=vader").status_code == 404
+    assert client.get("/search").status_code == 400
+    assert client.get("/search?q=yoda&after=!").status_code == 400
@@ -0,0 +1,31 @@
+import json
+import utils
+
+def create_people(client, count):
+    client.post("/people/bulk", json=[{"name": "Trooper %d" % index, "description": "Clone"} for index in range(count)])
+
+def ndjson(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+def test_stream_returns_one_object_per_line(client, monkeypatch):
+    # Smaller batches than rows, the stream spans several fetches
+    monkeypatch.setattr(utils, "STREAM_BATCH_SIZE", 2)
+    create_people(client, 5)
+    response = client.get("/people?stream=1")
+    assert response.mimetype == "application/x-ndjson"
+    rows = ndjson(response)
+    assert [row["name"] for row in rows] == ["Trooper %d" % index for index in range(5)]
+    assert rows[0]["description"] == "Clone"
+
+def test_accept_header_selects_the_stream(client):
+    create_people(client, 3)
+    response = client.get("/people", headers={"Accept": "application/x-ndjson"})
+    assert response.mimetype == "application/x-ndjson"
+    assert len(ndjson(response)) == 3
+    # The JSON and NDJSON bodies get different ETags
+    assert response.headers["ETag"] != client.get("/people").headers["ETag"]
+
+def test_stream_honours_fields(client):
+    create_people(client, 2)
+    assert ndjson(client.get("/planets?stream=1")) == []
+    assert ndjson(client.get("/people?stream=1&fields=name")) == [{"id": 1, "name": "Trooper 0"}, {"id": 2, "name": "Trooper 1"}]